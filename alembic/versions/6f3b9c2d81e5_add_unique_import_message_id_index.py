@@ -0,0 +1,39 @@
+"""Add unique index on imported bill message ids
+
+Revision ID: 6f3b9c2d81e5
+Revises: d2e81b6a47c3
+Create Date: 2026-10-18 19:12:44.318502
+
+"""
+
+from typing import Sequence
+from typing import Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "6f3b9c2d81e5"
+down_revision: Union[str, None] = "d2e81b6a47c3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Built concurrently so bills can still be written while this runs
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_bill_tenant_id_import_message_id",
+            "bill",
+            ["tenant_id", "message_id"],
+            unique=True,
+            postgresql_where=sa.text("message_id LIKE 'import-%'"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_bill_tenant_id_import_message_id", table_name="bill")
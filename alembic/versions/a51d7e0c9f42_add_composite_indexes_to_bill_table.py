@@ -0,0 +1,70 @@
+"""Add composite indexes to bill table
+
+Revision ID: a51d7e0c9f42
+Revises: 3c9a4f1e2b7d
+Create Date: 2026-10-18 14:37:02.904116
+
+"""
+
+from typing import Sequence
+from typing import Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "a51d7e0c9f42"
+down_revision: Union[str, None] = "3c9a4f1e2b7d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Built concurrently so bills can still be written while this runs
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_bill_tenant_id_date",
+            "bill",
+            ["tenant_id", "date", "category_id"],
+            postgresql_include=["value"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_bill_tenant_id_message_id",
+            "bill",
+            ["tenant_id", "message_id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_bill_tenant_id_fake",
+            "bill",
+            ["tenant_id"],
+            postgresql_where=sa.text("fake IS true"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        # Both are prefixes of, or covered by, the indexes above
+        op.drop_index(
+            "ix_bill_tenant_id",
+            table_name="bill",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_bill_message_id",
+            table_name="bill",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f("ix_bill_message_id"), "bill", ["message_id"], unique=False)
+    op.create_index(op.f("ix_bill_tenant_id"), "bill", ["tenant_id"], unique=False)
+    op.drop_index("ix_bill_tenant_id_fake", table_name="bill")
+    op.drop_index("ix_bill_tenant_id_message_id", table_name="bill")
+    op.drop_index("ix_bill_tenant_id_date", table_name="bill")
@@ -0,0 +1,61 @@
+"""Add reminder table
+
+Revision ID: d2e81b6a47c3
+Revises: a51d7e0c9f42
+Create Date: 2026-10-18 17:05:26.540391
+
+"""
+
+from typing import Sequence
+from typing import Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "d2e81b6a47c3"
+down_revision: Union[str, None] = "a51d7e0c9f42"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "reminder",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("tenant_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("description", sa.String(), nullable=False),
+        sa.Column("value", sa.Float(), nullable=True),
+        sa.Column(
+            "recurrence",
+            sa.Enum("ONCE", "DAILY", "WEEKLY", "MONTHLY", name="reminderrecurrence"),
+            nullable=False,
+        ),
+        sa.Column("starts_at", sa.DateTime(), nullable=False),
+        sa.Column("next_fire_at", sa.DateTime(), nullable=False),
+        sa.Column("active", sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["tenant_id"],
+            ["tenant.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["user_account.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_reminder_next_fire_at",
+        "reminder",
+        ["next_fire_at"],
+        postgresql_where=sa.text("active IS true"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_reminder_next_fire_at", table_name="reminder")
+    op.drop_table("reminder")
+    sa.Enum(name="reminderrecurrence").drop(op.get_bind())
@@ -0,0 +1,236 @@
+import argparse
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import select
+from src.cfg.database import AsyncSessionLocal
+from src.lib import fake_bills
+from src.model import Bill
+from src.model import BillDailyRollup
+from src.model import Category
+from src.model import Tenant
+from src.service import exporter
+from src.service.importer import IMPORT_CHUNK_SIZE
+from src.service.importer import StatementImporter
+from src.util.log import Logger
+
+log = Logger(name="cli")
+
+SEED_CATEGORIES = {
+    Category.DEFAULT_CATEGORY["name"]: Category.DEFAULT_CATEGORY["description"],
+    **Category.BASIC_CATEGORIES,
+}
+
+
+async def backfill_rollup(args):
+    async with AsyncSessionLocal() as session:
+        query = select(Tenant.id).order_by(Tenant.id)
+
+        if args.tenant:
+            query = query.where(Tenant.id.in_(args.tenant))
+
+        tenant_ids = (await session.execute(query)).scalars().all()
+
+    # One transaction per tenant so an interrupted backfill can just be rerun
+    for tenant_id in tenant_ids:
+        async with AsyncSessionLocal() as session:
+            await BillDailyRollup.rebuild(session, tenant_id)
+            await session.commit()
+
+        log.info(f"Rebuilt daily rollup for tenant {tenant_id}")
+
+    log.info(f"Backfilled daily rollup for {len(tenant_ids)} tenants")
+
+
+async def seed_tenants(args):
+    started = time.perf_counter()
+    created = 0
+    total_bills = 0
+
+    while created < args.tenants:
+        batch_size = min(args.batch_size, args.tenants - created)
+
+        async with AsyncSessionLocal() as session:
+            tenants = [Tenant(generated_fake_bills=True) for _ in range(batch_size)]
+            session.add_all(tenants)
+            await session.flush()
+
+            categories = {
+                tenant.id: [
+                    Category(name=name, description=description, tenant_id=tenant.id)
+                    for name, description in SEED_CATEGORIES.items()
+                ]
+                for tenant in tenants
+            }
+            session.add_all(
+                [category for items in categories.values() for category in items]
+            )
+            await session.flush()
+
+            rows = []
+            for tenant in tenants:
+                rows.extend(
+                    fake_bills.generate_fake_bills(
+                        [category.id for category in categories[tenant.id]],
+                        tenant.id,
+                        f"seed-{uuid.uuid4()}",
+                        days=args.days,
+                    )
+                )
+
+            total_bills += await Bill.copy_many(session, rows)
+
+            await BillDailyRollup.add_bills(
+                session, Bill.tenant_id.in_([tenant.id for tenant in tenants])
+            )
+
+            await session.commit()
+
+        created += batch_size
+
+        log.info(f"Seeded {created}/{args.tenants} tenants, {total_bills} bills")
+
+    log.info(
+        f"Seeded {created} tenants with {total_bills} fake bills "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+
+async def import_statement(args):
+    file_format = args.format or args.path.rsplit(".", 1)[-1].lower()
+
+    importer = StatementImporter(
+        AsyncSessionLocal,
+        args.tenant,
+        expenses=args.expenses,
+        use_ai=not args.no_ai,
+        chunk_size=args.chunk_size,
+        log=log,
+    )
+
+    with open(args.path, encoding=args.encoding, newline="") as file:
+        read, imported = await importer.run(file, file_format)
+
+    log.info(
+        f"Imported {imported} of {read} expenses from {args.path} "
+        f"using {importer.tokens_used} tokens"
+    )
+
+
+async def export_bills(args):
+    filters = dict(category_id=args.category_id)
+
+    if args.since or args.until:
+        filters["date_range"] = [args.since or "1970-01-01", args.until or "9999-12-31"]
+
+    async with AsyncSessionLocal() as session:
+        if args.output is None:
+            output, count, total = await exporter.export_to_file(
+                session, args.tenant, args.format, **filters
+            )
+        else:
+            output = args.output
+            with open(output, "w", newline="", encoding="utf-8") as file:
+                count, total = await exporter.export_bills(
+                    session, args.tenant, file, args.format, **filters
+                )
+
+    log.info(f"Exported {count} bills totalling R${total:.2f} to {output}")
+
+
+async def prune_exports(args):
+    deleted = exporter.cleanup_exports(args.days * 86400)
+
+    log.info(f"Deleted {deleted} exports older than {args.days} days")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Billy maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    backfill = subparsers.add_parser(
+        "backfill-rollup",
+        help="rebuild bill_daily_rollup from the bill table",
+    )
+    backfill.add_argument(
+        "--tenant",
+        type=int,
+        action="append",
+        help="only rebuild this tenant (can be repeated)",
+    )
+    backfill.set_defaults(handler=backfill_rollup)
+
+    seed = subparsers.add_parser(
+        "seed",
+        help="create tenants with default categories and a year of fake bills",
+    )
+    seed.add_argument("--tenants", type=int, required=True)
+    seed.add_argument("--days", type=int, default=fake_bills.FAKE_BILL_DAYS)
+    seed.add_argument(
+        "--batch-size",
+        type=int,
+        default=100,
+        help="tenants written per transaction",
+    )
+    seed.set_defaults(handler=seed_tenants)
+
+    statement = subparsers.add_parser(
+        "import-statement",
+        help="import the expenses of a CSV or OFX bank statement as bills",
+    )
+    statement.add_argument("path")
+    statement.add_argument("--tenant", type=int, required=True)
+    statement.add_argument(
+        "--format",
+        choices=("csv", "ofx"),
+        help="defaults to the file extension",
+    )
+    statement.add_argument(
+        "--expenses",
+        choices=("negative", "positive"),
+        default="negative",
+        help="sign of the expenses in the statement (credit card statements "
+        "usually list them as positive)",
+    )
+    statement.add_argument("--encoding", default="utf-8-sig")
+    statement.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    statement.add_argument(
+        "--no-ai",
+        action="store_true",
+        help="put what the category index cannot match in the default category",
+    )
+    statement.set_defaults(handler=import_statement)
+
+    export = subparsers.add_parser(
+        "export", help="export the bills of a tenant as CSV or JSON Lines"
+    )
+    export.add_argument("--tenant", type=int, required=True)
+    export.add_argument("--format", choices=exporter.EXPORT_FORMATS, default="csv")
+    export.add_argument("--since", help="first day to export (YYYY-MM-DD)")
+    export.add_argument("--until", help="last day to export (YYYY-MM-DD)")
+    export.add_argument("--category-id", type=int)
+    export.add_argument(
+        "--output",
+        help="defaults to a new file in EXPORT_DIR, kept for EXPORT_RETENTION_DAYS",
+    )
+    export.set_defaults(handler=export_bills)
+
+    prune = subparsers.add_parser(
+        "prune-exports", help="delete the old files in EXPORT_DIR"
+    )
+    prune.add_argument(
+        "--days",
+        type=float,
+        default=exporter.EXPORT_RETENTION_DAYS,
+        help="delete files older than this",
+    )
+    prune.set_defaults(handler=prune_exports)
+
+    args = parser.parse_args()
+
+    asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""Benchmark the bill access paths with the old and the new bill indexes.
+
+Seeds a throwaway `bill_benchmark` schema in the configured database with
+generate_series, then runs EXPLAIN ANALYZE for each hot query, first with the
+single-column indexes of the initial revision and then with the indexes
+declared on `Bill`. Point the DB_* variables at a local Postgres and run from
+the project root:
+
+    python -m scripts.benchmark_bill_indexes --tenants 5000 --bills-per-tenant 1000
+
+The seed is fixed, so two runs with the same arguments see the same data.
+"""
+
+import argparse
+import json
+import statistics
+
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
+from src.cfg.database import engine
+from src.model import Bill
+from src.model import Category
+from src.model import DeclarativeBaseModel
+from src.model import Tenant
+
+SCHEMA = "bill_benchmark"
+CATEGORIES_PER_TENANT = 9
+
+BASELINE_INDEXES = (
+    "CREATE INDEX ix_bill_tenant_id ON bill (tenant_id)",
+    "CREATE INDEX ix_bill_message_id ON bill (message_id)",
+)
+
+SEED_STATEMENTS = (
+    "SELECT setseed(:seed)",
+    """
+    INSERT INTO tenant (id, generated_fake_bills)
+    SELECT t, t % 10 = 0 FROM generate_series(1, :tenants) t
+    """,
+    f"""
+    INSERT INTO category (id, name, tenant_id)
+    SELECT (t - 1) * {CATEGORIES_PER_TENANT} + c, 'Categoria ' || c, t
+    FROM generate_series(1, :tenants) t,
+         generate_series(1, {CATEGORIES_PER_TENANT}) c
+    """,
+    # A tenth of the tenants get a year of fake bills, like RegisterFakeBills
+    f"""
+    INSERT INTO bill (value, date, category_id, tenant_id, message_id, fake)
+    SELECT
+        round((random() * 1000)::numeric, 2),
+        date_trunc('day', now()) - floor(random() * 730) * interval '1 day',
+        (t - 1) * {CATEGORIES_PER_TENANT}
+            + 1 + floor(random() * {CATEGORIES_PER_TENANT})::int,
+        t,
+        md5(t || '-' || b),
+        t % 10 = 0 AND b % 3 = 0
+    FROM generate_series(1, :tenants) t,
+         generate_series(1, :bills_per_tenant) b
+    """,
+)
+
+QUERIES = {
+    "get_many (tenant, month)": """
+        SELECT * FROM bill
+        WHERE tenant_id = :tenant_id
+          AND date BETWEEN now() - interval '30 days' AND now()
+    """,
+    "sum (tenant, year, category)": """
+        SELECT sum(value) FROM bill
+        WHERE tenant_id = :tenant_id
+          AND date BETWEEN now() - interval '365 days' AND now()
+          AND category_id = :category_id
+    """,
+    "sum_by_category (tenant, quarter)": """
+        SELECT category_id, sum(value), count(id) FROM bill
+        WHERE tenant_id = :tenant_id
+          AND date BETWEEN now() - interval '90 days' AND now()
+        GROUP BY category_id
+    """,
+    "get_by_message_id": """
+        SELECT * FROM bill
+        WHERE message_id = :message_id AND tenant_id = :tenant_id
+    """,
+    "fake bills (tenant)": """
+        SELECT id FROM bill
+        WHERE tenant_id = :tenant_id AND fake IS true
+    """,
+}
+
+
+def seed(connection, tenants, bills_per_tenant, seed_value):
+    connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+    connection.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    connection.execute(text(f"SET search_path TO {SCHEMA}"))
+
+    DeclarativeBaseModel.metadata.create_all(
+        connection,
+        tables=[Tenant.__table__, Category.__table__, Bill.__table__],
+    )
+
+    params = dict(seed=seed_value, tenants=tenants, bills_per_tenant=bills_per_tenant)
+    for statement in SEED_STATEMENTS:
+        connection.execute(text(statement), params)
+
+    connection.commit()
+
+
+def use_indexes(connection, statements):
+    for index in Bill.__table__.indexes:
+        connection.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+
+    connection.execute(text("DROP INDEX IF EXISTS ix_bill_tenant_id"))
+    connection.execute(text("DROP INDEX IF EXISTS ix_bill_message_id"))
+
+    for statement in statements:
+        connection.execute(text(statement))
+
+    connection.execute(text("VACUUM ANALYZE bill"))
+
+
+def sample_params(connection, tenants, samples):
+    params = []
+    for tenant_id in range(1, tenants + 1, max(tenants // samples, 1)):
+        category_id, message_id = connection.execute(
+            text(
+                "SELECT category_id, message_id FROM bill "
+                "WHERE tenant_id = :tenant_id LIMIT 1"
+            ),
+            dict(tenant_id=tenant_id),
+        ).one()
+        params.append(
+            dict(tenant_id=tenant_id, category_id=category_id, message_id=message_id)
+        )
+
+    return params[:samples]
+
+
+def explain(connection, query, params):
+    plan = connection.execute(
+        text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}"), params
+    ).scalar()[0]
+
+    node = plan["Plan"]
+    while "Index Name" not in node and node.get("Plans"):
+        node = node["Plans"][0]
+
+    return plan["Execution Time"], node["Node Type"], node.get("Index Name")
+
+
+def run_queries(connection, params, repeats):
+    results = {}
+    for name, query in QUERIES.items():
+        timings = []
+        for sample in params:
+            for _ in range(repeats):
+                timing, node_type, index_name = explain(connection, query, sample)
+                timings.append(timing)
+
+        results[name] = dict(
+            median_ms=round(statistics.median(timings), 3),
+            p95_ms=round(statistics.quantiles(timings, n=20)[-1], 3),
+            plan=f"{node_type} ({index_name})" if index_name else node_type,
+        )
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenants", type=int, default=2000)
+    parser.add_argument("--bills-per-tenant", type=int, default=1000)
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=float, default=0.42)
+    parser.add_argument("--skip-seed", action="store_true")
+    parser.add_argument("--output", help="also write the results as JSON here")
+    args = parser.parse_args()
+
+    new_indexes = [
+        str(CreateIndex(index).compile(engine)) for index in Bill.__table__.indexes
+    ]
+
+    # VACUUM cannot run inside a transaction
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if not args.skip_seed:
+            print(f"Seeding {args.tenants * args.bills_per_tenant} bills...")
+            seed(conn, args.tenants, args.bills_per_tenant, args.seed)
+
+        conn.execute(text(f"SET search_path TO {SCHEMA}"))
+
+        params = sample_params(conn, args.tenants, args.samples)
+
+        results = {}
+        for label, statements in (
+            ("before", BASELINE_INDEXES),
+            ("after", new_indexes),
+        ):
+            print(f"Building {label} indexes...")
+            use_indexes(conn, statements)
+            results[label] = run_queries(conn, params, args.repeats)
+
+    print(f"\n{'query':36} {'before ms':>10} {'after ms':>10}  plan after")
+    for name in QUERIES:
+        before, after = results["before"][name], results["after"][name]
+        print(
+            f"{name:36} {before['median_ms']:>10} {after['median_ms']:>10}"
+            f"  {after['plan']}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(
+                dict(
+                    tenants=args.tenants,
+                    bills_per_tenant=args.bills_per_tenant,
+                    seed=args.seed,
+                    results=results,
+                ),
+                file,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
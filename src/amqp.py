@@ -6,6 +6,7 @@ AMQP_HOST = os.getenv("AMQP_HOST", "rabbitmq")
 AMQP_PORT = int(os.getenv("AMQP_PORT", 5672))
 AMQP_USER = os.getenv("AMQP_USER", "billy")
 AMQP_PASSWORD = os.getenv("AMQP_PASSWORD", "billy")
+AMQP_PREFETCH_COUNT = int(os.getenv("AMQP_PREFETCH_COUNT", 32))
 
 AMQP_RECEIVE_MESSAGE_QUEUE = "q.message.receive"
 AMQP_SEND_MESSAGE_QUEUE = "q.message.send"
@@ -30,7 +31,10 @@ class AMQPClient:
             routing_key=routing_key,
         )
 
-    async def consume(self, queue_name, callback):
+    async def consume(self, queue_name, callback, prefetch_count=None):
+        if prefetch_count is not None:
+            await self.channel.set_qos(prefetch_count=prefetch_count)
+
         queue = await self.channel.get_queue(queue_name)
         await queue.consume(callback)
 
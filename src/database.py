@@ -1,35 +1,131 @@
-from contextlib import contextmanager
+from contextlib import asynccontextmanager
 from contextvars import ContextVar
 import json
 import os
+import time
 
-from src.cfg.database import SessionLocal
+from src.cfg.database import AsyncSessionLocal
 
 import redis
-from sqlalchemy.orm import Session
+import redis.asyncio
+from sqlalchemy.ext.asyncio import AsyncSession
 
 REDIS_HOST = os.getenv("REDIS_HOST")
 REDIS_PORT = os.getenv("REDIS_PORT")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 32))
 
-db_session_ctx: ContextVar[Session] = ContextVar("db_session_ctx")
+TOKEN_BUDGET_WINDOW = 3600
+TOKEN_BUDGET_BUCKET_SIZE = 60
+
+CONVERSATION_STATE_EXPIRATION = 3600
+
+TOKEN_USAGE_FUNCTIONS = """
+local function record_token_usage(key, bucket, tokens, oldest, ttl)
+    redis.call("HINCRBY", key, bucket, tokens)
+    redis.call("EXPIRE", key, ttl)
+    for _, field in ipairs(redis.call("HKEYS", key)) do
+        if tonumber(field) < tonumber(oldest) then
+            redis.call("HDEL", key, field)
+        end
+    end
+end
+
+local function get_token_usage(key, oldest)
+    local usage = redis.call("HGETALL", key)
+    local total = 0
+    for i = 1, #usage, 2 do
+        if tonumber(usage[i]) >= tonumber(oldest) then
+            total = total + tonumber(usage[i + 1])
+        end
+    end
+    return total
+end
+"""
+
+# KEYS[1]: token usage hash, ARGV: bucket, tokens, oldest bucket kept, ttl
+RECORD_TOKEN_USAGE_SCRIPT = (
+    TOKEN_USAGE_FUNCTIONS
+    + """
+record_token_usage(KEYS[1], ARGV[1], ARGV[2], ARGV[3], ARGV[4])
+"""
+)
+
+# KEYS[1]: token usage hash, ARGV: oldest bucket inside the window
+GET_TOKEN_USAGE_SCRIPT = (
+    TOKEN_USAGE_FUNCTIONS
+    + """
+return get_token_usage(KEYS[1], ARGV[1])
+"""
+)
+
+# KEYS: lock, state, token usage hash. ARGV: lock timeout, oldest bucket
+BOOTSTRAP_CONVERSATION_SCRIPT = (
+    TOKEN_USAGE_FUNCTIONS
+    + """
+if not redis.call("SET", KEYS[1], 1, "NX", "EX", ARGV[1]) then
+    return nil
+end
+local state = redis.call("GET", KEYS[2]) or ""
+return {state, get_token_usage(KEYS[3], ARGV[2])}
+"""
+)
+
+# KEYS: lock, state, token usage hash.
+# ARGV: state, state ttl, tokens, bucket, oldest bucket kept, token usage ttl
+COMMIT_CONVERSATION_SCRIPT = (
+    TOKEN_USAGE_FUNCTIONS
+    + """
+redis.call("SETEX", KEYS[2], ARGV[2], ARGV[1])
+if tonumber(ARGV[3]) > 0 then
+    record_token_usage(KEYS[3], ARGV[4], ARGV[3], ARGV[5], ARGV[6])
+end
+redis.call("DEL", KEYS[1])
+"""
+)
+
+# KEYS[1]: lock. ARGV[1]: token of the owner
+RELEASE_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+# KEYS[1]: lock. ARGV: token of the owner, timeout
+REFRESH_LOCK_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("EXPIRE", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+db_session_ctx: ContextVar[AsyncSession] = ContextVar("db_session_ctx")
 
 
 def get_db_session():
     return db_session_ctx.get()
 
 
-@contextmanager
-def db_session_manager():
-    session = SessionLocal()
+def on_commit(session, callback):
+    """Run `callback` once `db_session_manager` has committed the session."""
+    session.info.setdefault("on_commit", []).append(callback)
+
+
+@asynccontextmanager
+async def db_session_manager():
+    session = AsyncSessionLocal()
     token = db_session_ctx.set(session)
     try:
         yield session
-        session.commit()
+        await session.commit()
     except Exception:
-        session.rollback()
+        await session.rollback()
         raise
+    else:
+        for callback in session.info.pop("on_commit", []):
+            callback()
     finally:
-        session.close()
+        await session.close()
         db_session_ctx.reset(token)
 
 
@@ -80,4 +176,157 @@ class RedisClient:
         self.redis_client.close()
 
 
+class AsyncRedisClient:
+    def __init__(self, max_connections=REDIS_MAX_CONNECTIONS):
+        self.connection_pool = redis.asyncio.BlockingConnectionPool(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            max_connections=max_connections,
+            decode_responses=True,
+        )
+        self.redis_client = redis.asyncio.Redis(connection_pool=self.connection_pool)
+        self.release_lock_script = self.register_script(RELEASE_LOCK_SCRIPT)
+        self.refresh_lock_script = self.register_script(REFRESH_LOCK_SCRIPT)
+
+    async def set(self, key, value, expiration=3600):
+        await self.redis_client.setex(key, expiration, json.dumps(value))
+
+    async def get(self, key, default):
+        value = await self.redis_client.get(key)
+        if value is None:
+            return default
+        return json.loads(value)
+
+    async def delete(self, *keys):
+        return await self.redis_client.delete(*keys)
+
+    async def list_keys(self, pattern="*"):
+        return [key async for key in self.redis_client.scan_iter(match=pattern)]
+
+    async def get_many(self, pattern="*"):
+        keys = await self.list_keys(pattern)
+        if not keys:
+            return []
+        return await self.redis_client.mget(keys)
+
+    async def acquire_lock(self, key, timeout=30, token=1):
+        return await self.redis_client.set(key, token, nx=True, ex=timeout)
+
+    async def release_lock(self, key, token=None):
+        """Delete the lock, only while it still holds `token` when one is given."""
+        if token is None:
+            return await self.redis_client.delete(key)
+
+        return await self.release_lock_script(keys=[key], args=[token])
+
+    async def refresh_lock(self, key, token, timeout=30):
+        """Extend the lock while it still holds `token`, False once it was lost."""
+        return bool(await self.refresh_lock_script(keys=[key], args=[token, timeout]))
+
+    def register_script(self, script):
+        return self.redis_client.register_script(script)
+
+    async def close(self):
+        await self.redis_client.aclose()
+        await self.connection_pool.disconnect()
+
+
+class TokenBudget:
+    """Per-user token usage over a sliding one hour window.
+
+    Usage is kept in a single hash per user, with one field per minute bucket,
+    so both recording and reading are bounded by the number of buckets in the
+    window instead of the number of messages or keys in Redis.
+    """
+
+    def __init__(self, redis_client):
+        self.record_script = redis_client.register_script(RECORD_TOKEN_USAGE_SCRIPT)
+        self.usage_script = redis_client.register_script(GET_TOKEN_USAGE_SCRIPT)
+
+    @staticmethod
+    def key(phone_number):
+        return f"user:{phone_number}:token_usage"
+
+    @staticmethod
+    def current_bucket():
+        return int(time.time()) // TOKEN_BUDGET_BUCKET_SIZE
+
+    @classmethod
+    def oldest_bucket(cls):
+        return cls.current_bucket() - TOKEN_BUDGET_WINDOW // TOKEN_BUDGET_BUCKET_SIZE
+
+    async def record(self, phone_number, tokens_used):
+        if not tokens_used:
+            return
+
+        await self.record_script(
+            keys=[self.key(phone_number)],
+            args=[
+                self.current_bucket(),
+                tokens_used,
+                self.oldest_bucket(),
+                TOKEN_BUDGET_WINDOW + TOKEN_BUDGET_BUCKET_SIZE,
+            ],
+        )
+
+    async def get_used(self, phone_number):
+        return int(
+            await self.usage_script(
+                keys=[self.key(phone_number)], args=[self.oldest_bucket()]
+            )
+        )
+
+
+class ConversationStore:
+    """Loads and saves everything a message needs from Redis.
+
+    `bootstrap` takes the user lock and returns the conversation state and the
+    token usage, `commit` saves the state, records the tokens used and releases
+    the lock. Each one is a single atomic round-trip.
+    """
+
+    def __init__(self, redis_client):
+        self.bootstrap_script = redis_client.register_script(
+            BOOTSTRAP_CONVERSATION_SCRIPT
+        )
+        self.commit_script = redis_client.register_script(COMMIT_CONVERSATION_SCRIPT)
+
+    @staticmethod
+    def keys(phone_number):
+        return [
+            f"user:{phone_number}:lock",
+            f"user:{phone_number}:state",
+            TokenBudget.key(phone_number),
+        ]
+
+    async def bootstrap(self, phone_number, lock_timeout=30):
+        result = await self.bootstrap_script(
+            keys=self.keys(phone_number),
+            args=[lock_timeout, TokenBudget.oldest_bucket()],
+        )
+
+        if result is None:
+            return None
+
+        state, tokens_used = result
+
+        return json.loads(state) if state else {}, int(tokens_used)
+
+    async def commit(self, phone_number, state, tokens_used):
+        await self.commit_script(
+            keys=self.keys(phone_number),
+            args=[
+                json.dumps(state),
+                CONVERSATION_STATE_EXPIRATION,
+                tokens_used,
+                TokenBudget.current_bucket(),
+                TokenBudget.oldest_bucket(),
+                TOKEN_BUDGET_WINDOW + TOKEN_BUDGET_BUCKET_SIZE,
+            ],
+        )
+
+
 redis_client = RedisClient()
+async_redis_client = AsyncRedisClient()
+token_budget = TokenBudget(async_redis_client)
+conversation_store = ConversationStore(async_redis_client)
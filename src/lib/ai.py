@@ -2,17 +2,24 @@ from datetime import datetime
 import json
 import math
 import os
-
+from string import Formatter
+
+from src import util
+from src.database import async_redis_client
+from src.lib import nlp
+from src.lib.governor import LLMGovernor
+from src.lib.response_cache import LLM_CACHE_ENABLED
+from src.lib.response_cache import ResponseCache
 from src.model import BillyMood
 
 from google import genai
 from google.genai.types import GenerateContentConfig
-from httpx import ConnectError
-
-REQUEST_RETRIES = 3
 
 API_KEY = os.getenv("AI_PLATFORM_API_KEY", "")
 LLM_MODEL = os.getenv("LLM_MODEL", "")
+# Extract the arguments of the chosen intent in the same call as the intent
+FUSED_INTENT = os.getenv("AI_FUSED_INTENT", "false").lower() == "true"
+STREAM_ANALYSIS = os.getenv("AI_STREAM_ANALYSIS", "true").lower() == "true"
 PROMPTS_FILE_PATH = "data/ai.json"
 
 
@@ -28,72 +35,228 @@ def get_config(max_tokens, response_schema=None, temperature=0.0):
     )
 
 
+class PromptRegistry:
+    """Prompts, schemas and generation configs loaded once from the prompts file.
+
+    Call `reload` to pick up changes to the file without restarting.
+    """
+
+    DEFAULT_MAX_TOKENS = 100
+
+    def __init__(self, path=PROMPTS_FILE_PATH):
+        self.path = path
+        self.reload()
+
+    def reload(self):
+        with open(self.path, "r") as f:
+            data = json.load(f)
+
+        prompts = data["system_prompt"]
+        schemas = data["schema"]
+
+        placeholders = {}
+        for key, template in prompts.items():
+            if not isinstance(template, str):
+                raise ValueError(f"Prompt {key} must be a string")
+            placeholders[key] = {
+                field for _, field, _, _ in Formatter().parse(template) if field
+            }
+
+        for key, schema in schemas.items():
+            if not isinstance(schema, dict) or "type" not in schema:
+                raise ValueError(f"Schema {key} must be an object with a type")
+
+        configs = {
+            (key, self.DEFAULT_MAX_TOKENS, 0.0): get_config(
+                self.DEFAULT_MAX_TOKENS, schema
+            )
+            for key, schema in schemas.items()
+        }
+
+        self.prompts = prompts
+        self.placeholders = placeholders
+        self.schemas = schemas
+        self.configs = configs
+
+    def render(self, key, **kwargs):
+        template = self.prompts[key]
+
+        if not self.placeholders[key]:
+            return template
+
+        return template.format(**kwargs)
+
+    def get_schema(self, key):
+        return self.schemas[key]
+
+    def get_config(self, max_tokens, schema_key=None, temperature=0.0):
+        config_key = (schema_key, max_tokens, temperature)
+
+        if (config := self.configs.get(config_key)) is None:
+            schema = self.schemas[schema_key] if schema_key is not None else None
+            config = get_config(max_tokens, schema, temperature)
+            self.configs[config_key] = config
+
+        return config
+
+
 client = genai.Client(api_key=API_KEY)
+prompt_registry = PromptRegistry()
+response_cache = ResponseCache(async_redis_client, enabled=LLM_CACHE_ENABLED)
+governor = LLMGovernor()
 
 
 def get_prompt(key, **kwargs):
-    with open(PROMPTS_FILE_PATH, "r") as f:
-        data = json.load(f)
-    return data["system_prompt"][key].format(**kwargs)
+    return prompt_registry.render(key, **kwargs)
 
 
 def get_schema(key):
-    with open(PROMPTS_FILE_PATH, "r") as f:
-        data = json.load(f)
-    return data["schema"][key]
+    return prompt_registry.get_schema(key)
 
 
 async def get_user_intent(user_prompt, system_prompt=None):
     if system_prompt is None:
         system_prompt = get_prompt("INITIAL_INTENT")
 
-    schema = get_schema("INITIAL_INTENT")
-
-    tokens, intent_value = await generate_content([system_prompt, user_prompt], schema)
+    tokens, intent_value = await generate_content(
+        [system_prompt, user_prompt],
+        "INITIAL_INTENT",
+        cache_prompt_key="INITIAL_INTENT",
+    )
 
     return tokens, intent_value["intent"]
 
 
+async def get_user_intent_with_arguments(user_prompt, system_prompt, categories):
+    today = datetime.now().strftime("%Y-%m-%d")
+    system_prompt += "\n" + get_prompt(
+        "INTENT_ARGUMENTS", categories=categories, today=today
+    )
+
+    tokens, intent_value = await generate_content(
+        [system_prompt, user_prompt],
+        "INTENT_WITH_ARGUMENTS",
+        max_tokens=150,
+        cache_prompt_key="INTENT_ARGUMENTS",
+    )
+
+    return tokens, intent_value
+
+
 async def get_bill_to_register(user_prompt, categories):
     today = datetime.now().strftime("%Y-%m-%d")
     system_prompt = get_prompt("REGISTER_BILL", categories=categories, today=today)
-    schema = get_schema("REGISTER_BILL")
 
-    return await generate_content([system_prompt, user_prompt], schema)
+    return await generate_content(
+        [system_prompt, user_prompt], "REGISTER_BILL", cache_prompt_key="REGISTER_BILL"
+    )
+
+
+async def get_bill_category(user_prompt, categories):
+    system_prompt = get_prompt("CHOOSE_BILL_CATEGORY", categories=categories)
+
+    tokens, category = await generate_content(
+        [system_prompt, user_prompt],
+        "CHOOSE_CATEGORY",
+        cache_prompt_key="CHOOSE_BILL_CATEGORY",
+    )
+
+    return tokens, category["category_id"]
+
+
+async def get_bills_categories(descriptions, categories):
+    """Return `(tokens, {position: category_id})` for a batch of bill descriptions."""
+    system_prompt = get_prompt("CHOOSE_BILLS_CATEGORIES", categories=categories)
+    user_prompt = "\n".join(
+        f"{position}. {description}"
+        for position, description in enumerate(descriptions)
+    )
+
+    tokens, answer = await generate_content(
+        [system_prompt, user_prompt],
+        "CHOOSE_CATEGORIES",
+        max_tokens=50 + 20 * len(descriptions),
+        cache_prompt_key="CHOOSE_BILLS_CATEGORIES",
+    )
+
+    return tokens, {item["position"]: item["category_id"] for item in answer}
+
+
+async def get_bill_reminder(user_prompt):
+    today = datetime.now().strftime("%Y-%m-%d")
+    system_prompt = get_prompt("BILL_REMINDER_RECURRENCE", today=today)
+
+    return await generate_content(
+        [system_prompt, user_prompt],
+        "BILL_REMINDER",
+        cache_prompt_key="BILL_REMINDER_RECURRENCE",
+    )
 
 
 async def get_bills_query_data(user_prompt, categories):
     today = datetime.now().strftime("%Y-%m-%d")
     system_prompt = get_prompt("READ_BILLS", categories=categories, today=today)
-    schema = get_schema("READ_BILLS")
 
-    return await generate_content([system_prompt, user_prompt], schema)
+    return await generate_content(
+        [system_prompt, user_prompt], "READ_BILLS", cache_prompt_key="READ_BILLS"
+    )
 
 
 async def get_category_to_register(user_prompt):
     system_prompt = get_prompt("REGISTER_CATEGORY")
-    schema = get_schema("REGISTER_CATEGORY")
 
-    return await generate_content([system_prompt, user_prompt], schema)
+    return await generate_content(
+        [system_prompt, user_prompt],
+        "REGISTER_CATEGORY",
+        cache_prompt_key="REGISTER_CATEGORY",
+    )
 
 
 async def get_yes_or_no_answer(user_prompt):
+    if (answer := nlp.classify_yes_or_no(user_prompt)) is not None:
+        return 0, answer
+
     system_prompt = get_prompt("YES_OR_NO")
-    schema = get_schema("YES_OR_NO")
 
-    tokens, intent = await generate_content([system_prompt, user_prompt], schema)
+    tokens, intent = await generate_content(
+        [system_prompt, user_prompt], "YES_OR_NO", cache_prompt_key="YES_OR_NO"
+    )
 
     return tokens, intent["value"]
 
 
-async def get_expenses_analysis(categories, bills):
+async def get_expenses_analysis(categories, summary):
     system_prompt = get_prompt(
-        "ANALYZE_EXPENSE_TREND", categories=categories, bills=bills
+        "ANALYZE_EXPENSE_TREND", categories=categories, summary=summary
     )
 
     return await generate_content(system_prompt, max_tokens=300, temperature=0.7)
 
 
+async def stream_expenses_analysis(categories, summary):
+    """Yield `(text, tokens used so far)` as the analysis is generated."""
+    system_prompt = get_prompt(
+        "ANALYZE_EXPENSE_TREND", categories=categories, summary=summary
+    )
+
+    stream = governor.stream(
+        lambda: client.aio.models.generate_content_stream(
+            model=LLM_MODEL,
+            contents=system_prompt,
+            config=prompt_registry.get_config(300, temperature=0.7),
+        ),
+        tenant_id=util.get_tenant_id(),
+    )
+
+    tokens = 0
+
+    async for chunk in stream:
+        if chunk.usage_metadata and chunk.usage_metadata.total_token_count:
+            tokens = chunk.usage_metadata.total_token_count
+
+        yield chunk.text or "", tokens
+
+
 async def get_courtesy_answer(user_prompt):
     system_prompt = get_prompt("COURTESY_ANSWER")
 
@@ -107,7 +270,9 @@ async def get_courtesy_answer(user_prompt):
 async def get_chosen_billy_mood(user_prompt):
     system_prompt = get_prompt("CHOOSE_BILLY_MOOD")
 
-    tokens, answer = await generate_content([system_prompt, user_prompt])
+    tokens, answer = await generate_content(
+        [system_prompt, user_prompt], cache_prompt_key="CHOOSE_BILLY_MOOD"
+    )
 
     billy_mood = BillyMood(answer.strip())
 
@@ -127,23 +292,34 @@ async def get_billy_mood_response(user_prompt, billy_mood):
     return await generate_content([prompt], max_tokens=1000, temperature=0.9)
 
 
-async def generate_content(contents, schema=None, max_tokens=100, temperature=0.0):
-    for _ in range(REQUEST_RETRIES):
-        try:
-            response = await client.aio.models.generate_content(
-                model=LLM_MODEL,
-                contents=contents,
-                config=get_config(max_tokens, schema, temperature),
-            )
+async def generate_content(
+    contents, schema_key=None, max_tokens=100, temperature=0.0, cache_prompt_key=None
+):
+    config = prompt_registry.get_config(max_tokens, schema_key, temperature)
+
+    # Only deterministic [system prompt, user prompt] calls are cached
+    cache_key = None
+    if cache_prompt_key is not None and temperature == 0.0:
+        cache_key = response_cache.key(cache_prompt_key, schema_key, *contents)
 
-            if schema is not None:
-                resp = json.loads(response.text)
-            else:
-                resp = response.text
+        if (cached := await response_cache.get(cache_key)) is not None:
+            return 0, cached
+
+    response = await governor.run(
+        lambda: client.aio.models.generate_content(
+            model=LLM_MODEL,
+            contents=contents,
+            config=config,
+        ),
+        tenant_id=util.get_tenant_id(),
+    )
 
-            return response.usage_metadata.total_token_count, resp
+    if schema_key is not None:
+        resp = json.loads(response.text)
+    else:
+        resp = response.text
 
-        except ConnectError:
-            continue
+    if cache_key is not None:
+        await response_cache.set(cache_key, resp)
 
-    raise ConnectError(f"Failed to generate content after {REQUEST_RETRIES} retries")
+    return response.usage_metadata.total_token_count, resp
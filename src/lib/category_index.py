@@ -0,0 +1,156 @@
+from collections import Counter
+import math
+
+from src.lib import nlp
+from src.model import Category
+
+MATCH_THRESHOLD = 0.15
+MATCH_MARGIN = 2.0
+SHORTLIST_SIZE = 3
+STEM_SIZE = 6
+NAME_WEIGHT = 3
+
+STOPWORDS = {
+    "com",
+    "das",
+    "dos",
+    "para",
+    "pra",
+    "por",
+    "que",
+    "uma",
+    "como",
+    "nao",
+    "tudo",
+    "gastos",
+    "gastei",
+    "gasto",
+    "despesa",
+    "despesas",
+    "reais",
+    "real",
+    "valor",
+    "compra",
+    "comprei",
+    "paguei",
+    "hoje",
+    "ontem",
+    "anteontem",
+    "relacionado",
+    "relacionados",
+    "tambem",
+    "outras",
+    "outros",
+    "categorias",
+    "categoria",
+}
+
+
+def _terms(text):
+    return [
+        token[:STEM_SIZE]
+        for token in nlp.tokenize(text or "")
+        if len(token) > 2 and token not in STOPWORDS and not token.isdigit()
+    ]
+
+
+class CategoryIndex:
+    """TF-IDF index over a tenant's category names and descriptions.
+
+    Categories named after one of `Category.BASIC_CATEGORIES` are also indexed
+    with the seeded description, so renamed or shortened descriptions still
+    match the usual expenses.
+    """
+
+    def __init__(self, categories):
+        self.categories = list(categories)
+
+        basic_descriptions = {
+            nlp.normalize(name): description
+            for name, description in Category.BASIC_CATEGORIES.items()
+        }
+
+        documents = []
+        for category in self.categories:
+            terms = _terms(category["name"]) * NAME_WEIGHT
+            terms += _terms(category["description"])
+            basic_description = basic_descriptions.get(nlp.normalize(category["name"]))
+            if basic_description and basic_description != category["description"]:
+                terms += _terms(basic_description)
+            documents.append(Counter(terms))
+
+        document_frequency = Counter(
+            term for document in documents for term in document
+        )
+        self.idf = {
+            term: math.log((1 + len(documents)) / (1 + frequency)) + 1
+            for term, frequency in document_frequency.items()
+        }
+        self.vectors = [self._vector(document) for document in documents]
+
+    def _vector(self, counts):
+        vector = {
+            term: count * self.idf[term]
+            for term, count in counts.items()
+            if term in self.idf
+        }
+        norm = math.sqrt(sum(weight**2 for weight in vector.values()))
+        return {term: weight / norm for term, weight in vector.items()} if norm else {}
+
+    def search(self, text):
+        """Return `(score, category)` pairs sorted by cosine similarity."""
+        query = self._vector(Counter(_terms(text)))
+
+        results = [
+            (sum(weight * vector.get(term, 0) for term, weight in query.items()), c)
+            for vector, c in zip(self.vectors, self.categories)
+        ]
+        results.sort(key=lambda result: result[0], reverse=True)
+
+        return results
+
+    def match(self, text):
+        """Return the id of the category `text` clearly belongs to, or None."""
+        results = self.search(text)
+
+        if not results:
+            return None
+
+        best_score, best = results[0]
+        second_score = results[1][0] if len(results) > 1 else 0
+
+        if best_score >= MATCH_THRESHOLD and best_score >= second_score * MATCH_MARGIN:
+            return best["id"]
+
+        return None
+
+    def shortlist(self, text, size=SHORTLIST_SIZE):
+        """Return the best candidates for `text` plus the default category.
+
+        Every category is returned when nothing in `text` is indexed.
+        """
+        results = self.search(text)
+
+        candidates = [category for score, category in results[:size] if score > 0]
+
+        if not candidates:
+            return self.categories
+
+        default = self.default()
+        if default is not None and default not in candidates:
+            candidates.append(default)
+
+        return candidates
+
+    def default(self):
+        """Return the tenant's default category, or None if it was removed."""
+        default_name = nlp.normalize(Category.DEFAULT_CATEGORY["name"])
+
+        return next(
+            (
+                category
+                for category in self.categories
+                if nlp.normalize(category["name"]) == default_name
+            ),
+            None,
+        )
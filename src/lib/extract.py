@@ -0,0 +1,341 @@
+from datetime import date
+from datetime import timedelta
+import re
+
+from src.lib import nlp
+
+WEEKDAYS = {
+    "segunda": 0,
+    "terca": 1,
+    "quarta": 2,
+    "quinta": 3,
+    "sexta": 4,
+    "sabado": 5,
+    "domingo": 6,
+}
+
+RELATIVE_DAYS = {"hoje": 0, "ontem": 1, "anteontem": 2}
+
+MONTHS = {
+    "janeiro": 1,
+    "fevereiro": 2,
+    "marco": 3,
+    "abril": 4,
+    "maio": 5,
+    "junho": 6,
+    "julho": 7,
+    "agosto": 8,
+    "setembro": 9,
+    "outubro": 10,
+    "novembro": 11,
+    "dezembro": 12,
+}
+
+QUERY_STOPWORDS = {
+    "a",
+    "o",
+    "as",
+    "os",
+    "e",
+    "eu",
+    "me",
+    "meu",
+    "meus",
+    "minha",
+    "minhas",
+    "de",
+    "do",
+    "da",
+    "dos",
+    "das",
+    "em",
+    "no",
+    "na",
+    "nos",
+    "nas",
+    "com",
+    "por",
+    "para",
+    "pra",
+    "ate",
+    "que",
+    "qual",
+    "quanto",
+    "quantos",
+    "foi",
+    "foram",
+    "tive",
+    "tenho",
+    "gastei",
+    "gastou",
+    "gasto",
+    "gastos",
+    "gastamos",
+    "despesa",
+    "despesas",
+    "total",
+    "soma",
+    "some",
+    "somar",
+    "valor",
+    "diga",
+    "mostre",
+    "faca",
+    "fazer",
+    "uma",
+    "um",
+    "analise",
+    "analisar",
+    "analisa",
+    "resuma",
+    "resumo",
+    "resumir",
+    "todas",
+    "todos",
+    "tudo",
+    "geral",
+    "periodo",
+    "dia",
+    "semana",
+    "mes",
+    "ano",
+    "por",
+    "favor",
+    "billy",
+}
+
+NUMBER = r"\d{1,3}(?:\.\d{3})+(?:,\d{1,2})?|\d+(?:[.,]\d{1,2})?"
+# Numbers only match whole, never a prefix or suffix of a longer one
+NUMBER_END = r"(?![\d.,]*\d)"
+CURRENCY_AMOUNT_PATTERN = re.compile(
+    rf"r\$\s*({NUMBER}){NUMBER_END}"
+    rf"|(?<![\d.,])({NUMBER}){NUMBER_END}"
+    r"\s*(?:reais|real|conto|contos|pila|pilas)\b"
+)
+BARE_AMOUNT_PATTERN = re.compile(rf"(?<![\d/.,])({NUMBER})(?![\d/.,]*\d)")
+NUMBER_TOKEN_PATTERN = re.compile(r"\d+(?:[.,]\d+)+")
+NUMERIC_DATE_PATTERN = re.compile(r"\b(\d{1,2})/(\d{1,2})(?:/(\d{2}|\d{4}))?\b")
+DAY_OF_MONTH_PATTERN = re.compile(r"\bdia (\d{1,2})\b")
+RELATIVE_DAY_PATTERN = re.compile(r"\b(hoje|ontem|anteontem)\b")
+PERIOD_PATTERN = re.compile(
+    r"\b(?:(?:n?essa|n?esta|n?esse|n?este|ess[ae]|est[ae]) (semana|mes|ano)"
+    r"|(semana|mes|ano) (?:atual|corrente)"
+    r"|(semana|mes|ano) passad[oa]"
+    r"|ultim[oa]s? (\d+ )?(dias|semanas|meses|dia|semana|mes)"
+    r"|(?:(?:em|de|no mes de|durante) )?(" + "|".join(MONTHS) + r")"
+    r"(?: de (\d{4}))?)\b"
+)
+BETWEEN_DATES_PATTERN = re.compile(
+    r"\b(?:entre|de|desde) (?:o dia |dia )?(\d{1,2}/\d{1,2}(?:/\d{2,4})?)"
+    r" (?:e|ate|a) (?:o dia |dia )?(\d{1,2}/\d{1,2}(?:/\d{2,4})?)\b"
+)
+# "segunda" to "sexta" are also ordinals ("a segunda parcela"), they only
+# count as weekdays after a preposition or with "feira"
+WEEKDAY_PATTERN = re.compile(
+    r"\b(?:(?:na|no|nesta|neste|nessa|nesse|essa|esse|ultima|ultimo) "
+    r"(segunda|terca|quarta|quinta|sexta|sabado|domingo)(?: feira)?"
+    r"|(segunda|terca|quarta|quinta|sexta) feira"
+    r"|(sabado|domingo))\b"
+)
+
+
+def parse_amount(text):
+    if "," in text:
+        return float(text.replace(".", "").replace(",", "."))
+
+    if re.fullmatch(r"\d{1,3}(?:\.\d{3})+", text):
+        return float(text.replace(".", ""))
+
+    return float(text)
+
+
+def extract_amount(text):
+    """Return the amount in BRL mentioned in `text`, or None if unclear."""
+    text = text.lower()
+
+    # "1,234.56", "1.234,56" or "1,500" could be read either way
+    for token in NUMBER_TOKEN_PATTERN.findall(text):
+        if ("," in token and "." in token) or re.search(r",\d{3}", token):
+            return None
+
+    amounts = {
+        match.group(1) or match.group(2)
+        for match in CURRENCY_AMOUNT_PATTERN.finditer(text)
+    }
+
+    if not amounts:
+        text = NUMERIC_DATE_PATTERN.sub(" ", text)
+        text = DAY_OF_MONTH_PATTERN.sub(" ", nlp.strip_accents(text))
+        amounts = set(BARE_AMOUNT_PATTERN.findall(text))
+
+    if len(amounts) != 1:
+        return None
+
+    amount = parse_amount(amounts.pop())
+
+    return amount if amount > 0 else None
+
+
+def _build_date(year, month, day):
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _month_before(today):
+    return (today.replace(day=1) - timedelta(days=1)).replace(day=1)
+
+
+def extract_date(text, today=None):
+    """Return the single day mentioned in `text` relative to `today`.
+
+    Understands "hoje", "ontem", "anteontem", weekday names (the last
+    occurrence up to today), "dia 15" and dd/mm[/yyyy]. Returns None when no
+    date or more than one date is mentioned.
+    """
+    today = today or date.today()
+    text = nlp.strip_accents(text.lower())
+
+    dates = set()
+
+    for match in RELATIVE_DAY_PATTERN.finditer(text):
+        dates.add(today - timedelta(days=RELATIVE_DAYS[match.group(1)]))
+
+    for match in WEEKDAY_PATTERN.finditer(text):
+        weekday = next(group for group in match.groups() if group)
+        days_ago = (today.weekday() - WEEKDAYS[weekday]) % 7
+        dates.add(today - timedelta(days=days_ago))
+
+    for match in NUMERIC_DATE_PATTERN.finditer(text):
+        day, month, year = match.groups()
+        day, month = int(day), int(month)
+
+        if year is None:
+            parsed = _build_date(today.year, month, day)
+            if parsed is not None and parsed > today:
+                parsed = _build_date(today.year - 1, month, day)
+        else:
+            year = int(year) + 2000 if len(year) == 2 else int(year)
+            parsed = _build_date(year, month, day)
+
+        dates.add(parsed)
+
+    for match in DAY_OF_MONTH_PATTERN.finditer(text):
+        day = int(match.group(1))
+        parsed = _build_date(today.year, today.month, day)
+        if parsed is None or parsed > today:
+            previous_month = _month_before(today)
+            parsed = _build_date(previous_month.year, previous_month.month, day)
+        dates.add(parsed)
+
+    if len(dates) != 1 or None in dates:
+        return None
+
+    return dates.pop()
+
+
+def _month_range(year, month):
+    start = date(year, month, 1)
+    end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return start, end
+
+
+def _period_range(match, today):
+    current, this_, previous, amount, unit, month, year = (
+        match.group(1),
+        match.group(2),
+        match.group(3),
+        match.group(4),
+        match.group(5),
+        match.group(6),
+        match.group(7),
+    )
+    current = current or this_
+
+    if current == "semana":
+        return today - timedelta(days=today.weekday()), today
+    if current == "mes":
+        return today.replace(day=1), today
+    if current == "ano":
+        return today.replace(month=1, day=1), today
+
+    if previous == "semana":
+        end = today - timedelta(days=today.weekday() + 1)
+        return end - timedelta(days=6), end
+    if previous == "mes":
+        previous_month = _month_before(today)
+        return _month_range(previous_month.year, previous_month.month)
+    if previous == "ano":
+        return date(today.year - 1, 1, 1), date(today.year - 1, 12, 31)
+
+    if unit is not None:
+        amount = int(amount) if amount else 1
+        if unit.startswith("dia"):
+            return today - timedelta(days=amount - 1), today
+        if unit.startswith("semana"):
+            return today - timedelta(weeks=amount) + timedelta(days=1), today
+        return today - timedelta(days=30 * amount - 1), today
+
+    month = MONTHS[month]
+    if year is not None:
+        year = int(year)
+    else:
+        year = today.year if month <= today.month else today.year - 1
+
+    start, end = _month_range(year, month)
+
+    return start, min(end, today)
+
+
+def extract_date_range(text, today=None):
+    """Return the period mentioned in `text` in the READ_BILLS `range` format.
+
+    A single day becomes a one item list and a period becomes its first and
+    last day, as "YYYY-MM-DD" strings. Returns None when no period, or more
+    than one, is found.
+    """
+    today = today or date.today()
+    lowered = nlp.strip_accents(text.lower())
+
+    if match := BETWEEN_DATES_PATTERN.search(lowered):
+        start = extract_date(match.group(1), today)
+        end = extract_date(match.group(2), today)
+        if start is None or end is None or start > end:
+            return None
+        return [start.isoformat(), end.isoformat()]
+
+    periods = [
+        _period_range(match, today) for match in PERIOD_PATTERN.finditer(lowered)
+    ]
+
+    if len(periods) > 1:
+        return None
+
+    if periods:
+        if extract_date(PERIOD_PATTERN.sub(" ", lowered), today) is not None:
+            return None
+        start, end = periods[0]
+        return [start.isoformat(), end.isoformat()]
+
+    if (day := extract_date(lowered, today)) is not None:
+        return [day.isoformat()]
+
+    return None
+
+
+def extract_query_terms(text):
+    """Return the words of a bill query that are not about dates or filler."""
+    text = nlp.strip_accents(text.lower())
+
+    for pattern in (
+        BETWEEN_DATES_PATTERN,
+        PERIOD_PATTERN,
+        NUMERIC_DATE_PATTERN,
+        DAY_OF_MONTH_PATTERN,
+        RELATIVE_DAY_PATTERN,
+        WEEKDAY_PATTERN,
+    ):
+        text = pattern.sub(" ", text)
+
+    return [token for token in nlp.tokenize(text) if token not in QUERY_STOPWORDS]
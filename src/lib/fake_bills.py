@@ -0,0 +1,39 @@
+from datetime import datetime
+from datetime import timedelta
+import random
+
+FAKE_BILL_DAYS = 365
+BILLS_PER_DAY = (1, 2, 3)
+MAX_VALUE = 1000
+
+
+def generate_fake_bills(category_ids, tenant_id, message_id, days=FAKE_BILL_DAYS):
+    """Return rows for `Bill` covering the last `days` days, ready for a bulk insert.
+
+    Every random draw is made in one call per column instead of per bill.
+    """
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    counts = random.choices(BILLS_PER_DAY, k=days)
+    total = sum(counts)
+
+    dates = [
+        today - timedelta(days=day)
+        for day, count in enumerate(counts)
+        for _ in range(count)
+    ]
+    categories = random.choices(category_ids, k=total)
+    values = random.choices(range(1, MAX_VALUE + 1), k=total)
+
+    return [
+        dict(
+            value=float(value),
+            date=date,
+            original_prompt=None,
+            category_id=category_id,
+            tenant_id=tenant_id,
+            message_id=message_id,
+            fake=True,
+        )
+        for value, date, category_id in zip(values, dates, categories)
+    ]
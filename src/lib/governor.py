@@ -0,0 +1,281 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+import os
+import random
+import time
+
+from src.util.log import Logger
+
+from google.genai import errors
+import httpx
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 32))
+LLM_MAX_TENANT_CONCURRENCY = int(os.getenv("LLM_MAX_TENANT_CONCURRENCY", 4))
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", 20))
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", 3))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.2))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 5))
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", 5))
+LLM_CIRCUIT_RECOVERY_TIME = float(os.getenv("LLM_CIRCUIT_RECOVERY_TIME", 30))
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", 0.95))
+LLM_HEDGE_MIN_SAMPLES = 50
+LATENCY_SAMPLES = 500
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def is_retryable(error):
+    if isinstance(error, (httpx.TransportError, asyncio.TimeoutError)):
+        return True
+
+    if isinstance(error, errors.ServerError):
+        return True
+
+    return isinstance(error, errors.ClientError) and error.code == 429
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_threshold=LLM_CIRCUIT_FAILURE_THRESHOLD,
+        recovery_time=LLM_CIRCUIT_RECOVERY_TIME,
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def allow(self):
+        if self.opened_at is None:
+            return True
+
+        # Half open, let a single request through to probe the provider
+        if (
+            not self.trial_in_flight
+            and time.monotonic() - self.opened_at >= self.recovery_time
+        ):
+            self.trial_in_flight = True
+            return True
+
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+
+class LLMGovernor:
+    """Client side limits around calls to the LLM provider.
+
+    Calls are capped globally and per tenant, retried with exponential backoff
+    and full jitter on transient errors and bounded by a single deadline. After
+    repeated failures the circuit opens and calls fail fast with
+    `CircuitOpenError`. Optionally a duplicate request is sent when the first
+    one is slower than the observed latency quantile, the first response wins.
+    """
+
+    def __init__(
+        self,
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        max_tenant_concurrency=LLM_MAX_TENANT_CONCURRENCY,
+        timeout=LLM_REQUEST_TIMEOUT,
+        retries=LLM_RETRIES,
+        hedge=LLM_HEDGE_ENABLED,
+    ):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_tenant_concurrency = max_tenant_concurrency
+        # tenant_id -> [semaphore, calls running or waiting]
+        self.tenant_semaphores = {}
+        self.timeout = timeout
+        self.retries = retries
+        self.hedge = hedge
+        self.circuit_breaker = CircuitBreaker()
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.logger = Logger(name="llm_governor")
+
+    async def run(self, request, tenant_id=None):
+        """Run `request`, a callable returning a new awaitable for each try."""
+        async with self._tenant_semaphore(tenant_id), self.semaphore:
+            # A single deadline for all the tries, backoff included
+            deadline = time.monotonic() + self.timeout
+
+            result, latency = await self._retry(lambda: self._hedged(request), deadline)
+
+            self.latencies.append(latency)
+            self.circuit_breaker.record_success()
+
+            return result
+
+    async def stream(self, request, tenant_id=None):
+        """Yield the chunks of `request`, a callable returning a new stream.
+
+        The limits are held until the stream is exhausted and its outcome is
+        reported to the circuit breaker only then. Tries are repeated until the
+        first chunk arrives, after that a failure ends the stream.
+        """
+        async with self._tenant_semaphore(tenant_id), self.semaphore:
+            deadline = time.monotonic() + self.timeout
+
+            async def first_chunk():
+                stream = await request()
+                return stream, await anext(stream, None)
+
+            (stream, chunk), _ = await self._retry(first_chunk, deadline)
+
+            try:
+                while chunk is not None:
+                    yield chunk
+
+                    chunk = await asyncio.wait_for(
+                        anext(stream, None),
+                        timeout=max(deadline - time.monotonic(), 0),
+                    )
+            except Exception as e:
+                if is_retryable(e):
+                    self.circuit_breaker.record_failure()
+                else:
+                    self.circuit_breaker.trial_in_flight = False
+                raise
+            except BaseException:
+                self.circuit_breaker.trial_in_flight = False
+                raise
+
+            self.circuit_breaker.record_success()
+
+    async def _retry(self, request, deadline):
+        """Return the result of `request` and how long its last try took.
+
+        Success is left for the caller to record, a try that returned may
+        still fail afterwards, like a stream.
+        """
+        for attempt in range(self.retries):
+            if not self.circuit_breaker.allow():
+                raise CircuitOpenError("LLM provider circuit is open")
+
+            start = time.monotonic()
+
+            try:
+                result = await asyncio.wait_for(
+                    request(), timeout=max(deadline - start, 0)
+                )
+            except Exception as e:
+                if not is_retryable(e):
+                    self.circuit_breaker.trial_in_flight = False
+                    raise
+
+                self.logger.error(f"LLM request failed ({attempt + 1}): {e!r}")
+
+                # The breaker counts calls, one that gives up is one failure.
+                # A half open probe is not retried, it reopens the circuit
+                backoff = self._backoff(attempt)
+                if (
+                    attempt == self.retries - 1
+                    or time.monotonic() + backoff >= deadline
+                    or self.circuit_breaker.is_open
+                ):
+                    self.circuit_breaker.record_failure()
+                    raise
+
+                await asyncio.sleep(backoff)
+                continue
+            except BaseException:
+                # Cancelled, the trial request did not fail the provider
+                self.circuit_breaker.trial_in_flight = False
+                raise
+
+            return result, time.monotonic() - start
+
+    @asynccontextmanager
+    async def _tenant_semaphore(self, tenant_id):
+        # Calls without a tenant (onboarding, notifications) come from many
+        # different users, only the global limit applies to them
+        if tenant_id is None:
+            yield
+            return
+
+        # Semaphores only live while the tenant has calls running or waiting,
+        # so the mapping does not grow with every tenant ever seen
+        if tenant_id not in self.tenant_semaphores:
+            self.tenant_semaphores[tenant_id] = [
+                asyncio.Semaphore(self.max_tenant_concurrency),
+                0,
+            ]
+
+        entry = self.tenant_semaphores[tenant_id]
+        entry[1] += 1
+
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self.tenant_semaphores[tenant_id]
+
+    @staticmethod
+    def _backoff(attempt):
+        return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2**attempt))
+
+    def _hedge_delay(self):
+        if not self.hedge or len(self.latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+
+        latencies = sorted(self.latencies)
+        return latencies[int(len(latencies) * LLM_HEDGE_QUANTILE) - 1]
+
+    async def _duplicate(self, request):
+        # The duplicate is another request in flight, it takes its own slot of
+        # the global limit. The tenant's slot is shared with the first request
+        async with self.semaphore:
+            return await request()
+
+    async def _hedged(self, request):
+        if (hedge_delay := self._hedge_delay()) is None:
+            return await request()
+
+        tasks = {asyncio.ensure_future(request())}
+
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+
+            if not done:
+                self.logger.info(f"Hedging LLM request after {hedge_delay:.2f}s")
+                tasks.add(asyncio.ensure_future(self._duplicate(request)))
+
+            while True:
+                done, pending = await asyncio.wait(
+                    tasks, return_when=asyncio.FIRST_COMPLETED
+                )
+                finished = [task for task in done if not task.cancelled()]
+
+                for task in finished:
+                    if task.exception() is None:
+                        return task.result()
+
+                if not pending:
+                    if not finished:
+                        raise asyncio.CancelledError()
+
+                    return finished[0].result()
+
+                tasks = pending
+        finally:
+            for task in tasks:
+                task.cancel()
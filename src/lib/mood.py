@@ -0,0 +1,40 @@
+import os
+import random
+
+from src.lib import ai
+
+from cachetools import LRUCache
+
+MOOD_VARIANTS = int(os.getenv("MOOD_VARIANTS", 3))
+MOOD_CACHE_SIZE = int(os.getenv("MOOD_CACHE_SIZE", 512))
+
+
+class MoodRenderer:
+    """Rewrites messages with Billy's mood.
+
+    Static messages keep up to `variants` rewrites per mood, once they are all
+    generated one of them is picked at random instead of asking the LLM again.
+    """
+
+    def __init__(self, variants=MOOD_VARIANTS, maxsize=MOOD_CACHE_SIZE):
+        self.variants = variants
+        self.cache = LRUCache(maxsize=maxsize)
+
+    async def render(self, message, billy_mood, static=False):
+        if not static:
+            return await ai.get_billy_mood_response(message, billy_mood)
+
+        key = (message, billy_mood)
+        variants = self.cache.get(key, [])
+
+        if len(variants) >= self.variants:
+            return 0, random.choice(variants)
+
+        tokens, rendered = await ai.get_billy_mood_response(message, billy_mood)
+
+        self.cache[key] = [*self.cache.get(key, []), rendered][: self.variants]
+
+        return tokens, rendered
+
+
+mood_renderer = MoodRenderer()
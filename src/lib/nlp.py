@@ -0,0 +1,164 @@
+import re
+import unicodedata
+
+INTENT_CONFIDENCE_THRESHOLD = 0.85
+
+AFFIRMATIVE_EMOJIS = ("👍", "👌", "✅", "✔", "🙌", "👏", "😀", "😁", "😃", "🤝", "❤")
+NEGATIVE_EMOJIS = ("👎", "❌", "✖", "🚫", "🙅")
+
+AFFIRMATIVE_ANSWERS = {
+    "s",
+    "sim",
+    "ss",
+    "sim sim",
+    "claro",
+    "claro que sim",
+    "com certeza",
+    "certeza",
+    "certo",
+    "ok",
+    "okay",
+    "okk",
+    "beleza",
+    "blz",
+    "pode",
+    "pode ser",
+    "pode sim",
+    "pode fazer",
+    "pode cadastrar",
+    "por favor",
+    "sim por favor",
+    "quero",
+    "quero sim",
+    "aceito",
+    "bora",
+    "vamos",
+    "vamo",
+    "isso",
+    "isso mesmo",
+    "exato",
+    "perfeito",
+    "positivo",
+    "afirmativo",
+    "tudo bem",
+    "ta bom",
+    "ta",
+    "t",
+    "yes",
+    "y",
+    "uhum",
+    "aham",
+    "sure",
+    "manda ver",
+    "faz isso",
+    "gostaria",
+    "gostaria sim",
+    "desejo",
+    "yes please",
+}
+
+NEGATIVE_ANSWERS = {
+    "n",
+    "nao",
+    "nn",
+    "nao nao",
+    "nao obrigado",
+    "nao obrigada",
+    "nao quero",
+    "nao precisa",
+    "nao pode",
+    "nao gostaria",
+    "nao desejo",
+    "nao aceito",
+    "negativo",
+    "nunca",
+    "jamais",
+    "de jeito nenhum",
+    "nem pensar",
+    "melhor nao",
+    "agora nao",
+    "nope",
+    "no",
+    "dispenso",
+    "deixa pra la",
+    "obrigado nao",
+    "obrigada nao",
+}
+
+
+def strip_accents(text):
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def normalize(text):
+    text = strip_accents(text.lower())
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def tokenize(text):
+    return normalize(text).split()
+
+
+def classify_intent(text, intent_rules, threshold=INTENT_CONFIDENCE_THRESHOLD):
+    """Return the intent whose rules match `text` with the highest confidence.
+
+    `intent_rules` maps intent names to `(compiled pattern, confidence)` pairs,
+    patterns are searched in the normalized text. None is returned when no
+    intent reaches `threshold` or when more than one does.
+    """
+    text = normalize(text)
+
+    scores = {}
+    for intent, rules in intent_rules.items():
+        for pattern, confidence in rules:
+            if confidence > scores.get(intent, 0) and pattern.search(text):
+                scores[intent] = confidence
+
+    confident = [intent for intent, score in scores.items() if score >= threshold]
+
+    if len(confident) != 1:
+        return None
+
+    return confident[0]
+
+
+def classify_yes_or_no(text):
+    """Return True or False for clear yes/no answers and None when unsure."""
+    affirmative = any(emoji in text for emoji in AFFIRMATIVE_EMOJIS)
+    negative = any(emoji in text for emoji in NEGATIVE_EMOJIS)
+
+    text = normalize(text)
+
+    if not text:
+        if affirmative != negative:
+            return affirmative
+        return None
+
+    text = re.sub(r"(.)\1{2,}", r"\1", text)
+    text = re.sub(r"^(ah|ahn|hmm|hm|entao|olha|bom) ", "", text)
+
+    if text in AFFIRMATIVE_ANSWERS and not negative:
+        return True
+
+    if text in NEGATIVE_ANSWERS and not affirmative:
+        return False
+
+    return None
+
+
+def match_category_name(text, categories):
+    """Return the id of the only category whose name appears in `text`."""
+    text = f" {normalize(text)} "
+
+    matches = [
+        category["id"]
+        for category in categories
+        if f" {normalize(category['name'])} " in text
+    ]
+
+    if len(matches) != 1:
+        return None
+
+    return matches[0]
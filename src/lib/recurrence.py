@@ -0,0 +1,44 @@
+import calendar
+from datetime import timedelta
+
+ONCE = "once"
+DAILY = "daily"
+WEEKLY = "weekly"
+MONTHLY = "monthly"
+
+INTERVALS = {DAILY: timedelta(days=1), WEEKLY: timedelta(weeks=1)}
+
+
+def _add_months(anchor, months):
+    # Months without the anchor's day fall back to their last day, but later
+    # months go back to the anchor's day instead of drifting
+    years, month = divmod(anchor.month - 1 + months, 12)
+    year = anchor.year + years
+    day = min(anchor.day, calendar.monthrange(year, month + 1)[1])
+
+    return anchor.replace(year=year, month=month + 1, day=day)
+
+
+def next_occurrence(recurrence, anchor, after):
+    """Return the first occurrence of the rule started at `anchor` later than `after`.
+
+    One-off rules have no occurrence after their anchor and return None.
+    """
+    if anchor > after:
+        return anchor
+
+    if recurrence == ONCE:
+        return None
+
+    if recurrence in INTERVALS:
+        interval = INTERVALS[recurrence]
+        return anchor + ((after - anchor) // interval + 1) * interval
+
+    if recurrence == MONTHLY:
+        months = (after.year - anchor.year) * 12 + after.month - anchor.month
+        occurrence = _add_months(anchor, months)
+        if occurrence <= after:
+            occurrence = _add_months(anchor, months + 1)
+        return occurrence
+
+    raise ValueError(f"Unknown recurrence: {recurrence}")
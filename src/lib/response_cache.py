@@ -0,0 +1,85 @@
+from collections import Counter
+import copy
+import hashlib
+import os
+
+from src.util.log import Logger
+
+from cachetools import TTLCache
+from redis.exceptions import RedisError
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 86400))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", 4096))
+STATS_LOG_INTERVAL = 100
+
+
+class ResponseCache:
+    """Two tier cache for deterministic LLM responses.
+
+    Entries live in an in-process TTL/LRU cache backed by Redis, so a response
+    generated on one node is reused by the others. Hits and misses per tier
+    are counted in `stats`.
+    """
+
+    def __init__(
+        self, redis_client, maxsize=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL, enabled=True
+    ):
+        self.redis_client = redis_client
+        self.local_cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.ttl = ttl
+        self.enabled = enabled
+        self.stats = Counter()
+        self.logger = Logger(name="response_cache")
+
+    @staticmethod
+    def key(prompt_key, schema_key, system_prompt, user_prompt):
+        # The rendered system prompt carries the injected context (categories,
+        # today's date), hashing it keeps entries apart per tenant and per day.
+        # Only case and whitespace are folded, punctuation and accents can
+        # change the answer ("10,50" and "1050" are different bills)
+        context_hash = hashlib.sha256(system_prompt.encode()).hexdigest()
+        prompt = " ".join(user_prompt.lower().split())
+        digest = hashlib.sha256(
+            "\0".join([schema_key or "", context_hash, prompt]).encode()
+        ).hexdigest()
+
+        return f"llm_cache:{prompt_key}:{digest}"
+
+    async def get(self, key):
+        if not self.enabled:
+            return None
+
+        if sum(self.stats.values()) % STATS_LOG_INTERVAL == 0 and self.stats:
+            self.logger.info(f"LLM cache stats: {dict(self.stats)}")
+
+        if (value := self.local_cache.get(key)) is not None:
+            self.stats["local_hit"] += 1
+            # Callers may change the response, the cached entry must stay as stored
+            return copy.deepcopy(value)
+
+        try:
+            value = await self.redis_client.get(key, None)
+        except RedisError as e:
+            self.logger.error(f"Failed to read LLM cache: {e}")
+            value = None
+
+        if value is None:
+            self.stats["miss"] += 1
+            return None
+
+        self.stats["redis_hit"] += 1
+        self.local_cache[key] = copy.deepcopy(value)
+
+        return value
+
+    async def set(self, key, value):
+        if not self.enabled:
+            return
+
+        self.local_cache[key] = copy.deepcopy(value)
+
+        try:
+            await self.redis_client.set(key, value, self.ttl)
+        except RedisError as e:
+            self.logger.error(f"Failed to write LLM cache: {e}")
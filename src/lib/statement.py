@@ -0,0 +1,155 @@
+import csv
+from datetime import datetime
+import io
+import itertools
+import re
+
+from src.lib import extract
+from src.lib import nlp
+
+SNIFF_SIZE = 4096
+OFX_READ_SIZE = 65536
+
+CSV_COLUMNS = {
+    "date": ("data", "date", "data lancamento", "data da compra", "dt"),
+    "description": (
+        "descricao",
+        "description",
+        "historico",
+        "lancamento",
+        "estabelecimento",
+        "titulo",
+        "title",
+        "memo",
+    ),
+    "value": ("valor", "value", "amount", "quantia"),
+}
+
+DATE_FORMATS = ("%d/%m/%Y", "%Y-%m-%d", "%d/%m/%y", "%d-%m-%Y", "%Y%m%d")
+
+AMOUNT_PATTERN = re.compile(r"[^\d,.-]")
+
+
+def parse_date(text):
+    text = text.strip()[:10]
+
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format)
+        except ValueError:
+            continue
+
+    raise ValueError(f"Unknown date format: {text!r}")
+
+
+def parse_value(text):
+    text = AMOUNT_PATTERN.sub("", text)
+    negative = text.startswith("-") or text.endswith("-")
+    text = text.strip("-")
+
+    # With both separators the last one is the decimal one, "1,234.56" is
+    # the English way of writing 1.234,56
+    if "," in text and text.rfind(".") > text.rfind(","):
+        text = text.replace(",", "")
+
+    value = extract.parse_amount(text)
+
+    return -value if negative else value
+
+
+def _find_columns(header):
+    columns = {}
+    for key, names in CSV_COLUMNS.items():
+        for index, name in enumerate(header):
+            if nlp.normalize(name).startswith(names):
+                columns[key] = index
+                break
+        else:
+            raise ValueError(f"Could not find the {key} column in {header}")
+
+    return columns
+
+
+def read_csv(file):
+    """Yield one transaction dict per row of a bank statement CSV.
+
+    The delimiter is sniffed from the beginning of the file and the date,
+    description and value columns are found by their (Portuguese or English)
+    header names. Rows are read one at a time, the file does not need to be
+    seekable.
+    """
+    sample = file.read(SNIFF_SIZE)
+
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+
+    # Put the sample back in front of the rest, completing its last line
+    lines = itertools.chain(io.StringIO(sample + file.readline()), file)
+
+    reader = csv.reader(lines, dialect)
+    columns = _find_columns(next(reader))
+
+    for row in reader:
+        if not any(row):
+            continue
+
+        yield dict(
+            date=parse_date(row[columns["date"]]),
+            description=row[columns["description"]].strip(),
+            value=parse_value(row[columns["value"]]),
+            reference=None,
+        )
+
+
+def _ofx_tokens(file):
+    buffer = ""
+    while chunk := file.read(OFX_READ_SIZE):
+        buffer += chunk
+        *tokens, buffer = buffer.split("<")
+        yield from tokens
+
+    if buffer:
+        yield buffer
+
+
+def read_ofx(file):
+    """Yield one transaction dict per STMTTRN of an OFX file.
+
+    Works for both the SGML (1.x) and the XML (2.x) flavours, since closing
+    tags are simply ignored. The file is tokenized in chunks.
+    """
+    transaction = None
+
+    for token in _ofx_tokens(file):
+        tag, _, value = token.partition(">")
+        tag = tag.strip().upper()
+        value = value.strip()
+
+        if tag == "STMTTRN":
+            transaction = {}
+
+        elif tag == "/STMTTRN" and transaction is not None:
+            yield dict(
+                date=parse_date(transaction["DTPOSTED"][:8]),
+                description=transaction.get("MEMO") or transaction.get("NAME", ""),
+                value=parse_value(transaction["TRNAMT"]),
+                reference=transaction.get("FITID"),
+            )
+            transaction = None
+
+        elif transaction is not None and not tag.startswith("/"):
+            transaction[tag] = value
+
+
+def read_statement(file, file_format):
+    readers = dict(csv=read_csv, ofx=read_ofx)
+
+    return readers[file_format](file)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
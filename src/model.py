@@ -1,22 +1,39 @@
 import enum
 
+from src.lib import recurrence
 from src.util import formatted_date
+from src.util import parse_date
 
 from sqlalchemy import Boolean
 from sqlalchemy import Column
+from sqlalchemy import Date
 from sqlalchemy import DateTime
 from sqlalchemy import Enum
 from sqlalchemy import Float
 from sqlalchemy import ForeignKey
+from sqlalchemy import Index
 from sqlalchemy import Integer
 from sqlalchemy import String
 from sqlalchemy import and_
+from sqlalchemy import cast
+from sqlalchemy import delete
+from sqlalchemy import func
+from sqlalchemy import insert as bulk_insert
+from sqlalchemy import literal_column
 from sqlalchemy import select
+from sqlalchemy import text
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncAttrs
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm import relationship
+from sqlalchemy.orm import validates
 
+# message_id prefix of the bills created from bank statements
+IMPORT_MESSAGE_ID_PREFIX = "import-"
 
-class DeclarativeBaseModel(DeclarativeBase):
+
+class DeclarativeBaseModel(AsyncAttrs, DeclarativeBase):
     pass
 
 
@@ -28,6 +45,13 @@ class BillyMood(enum.Enum):
     SAD = "sad"
 
 
+class ReminderRecurrence(enum.Enum):
+    ONCE = recurrence.ONCE
+    DAILY = recurrence.DAILY
+    WEEKLY = recurrence.WEEKLY
+    MONTHLY = recurrence.MONTHLY
+
+
 class Category(DeclarativeBaseModel):
     __tablename__ = "category"
 
@@ -56,8 +80,9 @@ class Category(DeclarativeBaseModel):
     tenant = relationship("Tenant", back_populates="categories")
 
     @classmethod
-    def get_all(cls, session, tenant_id):
-        return session.execute(select(cls).where(cls.tenant_id == tenant_id)).scalars()
+    async def get_all(cls, session, tenant_id):
+        result = await session.execute(select(cls).where(cls.tenant_id == tenant_id))
+        return result.scalars()
 
     def to_dict(self):
         return dict(id=self.id, name=self.name, description=self.description)
@@ -65,39 +90,223 @@ class Category(DeclarativeBaseModel):
 
 class Bill(DeclarativeBaseModel):
     __tablename__ = "bill"
+    __table_args__ = (
+        # Period queries filter on tenant and date, sometimes on category, and
+        # mostly read the value, so sums can be answered from the index alone
+        Index(
+            "ix_bill_tenant_id_date",
+            "tenant_id",
+            "date",
+            "category_id",
+            postgresql_include=["value"],
+        ),
+        Index("ix_bill_tenant_id_message_id", "tenant_id", "message_id"),
+        Index(
+            "ix_bill_tenant_id_fake",
+            "tenant_id",
+            postgresql_where=text("fake IS true"),
+        ),
+        # Statement imports running at the same time must not both insert a row
+        Index(
+            "ix_bill_tenant_id_import_message_id",
+            "tenant_id",
+            "message_id",
+            unique=True,
+            postgresql_where=text(f"message_id LIKE '{IMPORT_MESSAGE_ID_PREFIX}%'"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True)
     value = Column(Float, nullable=False)
     date = Column(DateTime, nullable=False)
     original_prompt = Column(String, nullable=True)
     category_id = Column(Integer, ForeignKey("category.id"), nullable=True)
-    tenant_id = Column(Integer, ForeignKey("tenant.id"), index=True, nullable=False)
-    message_id = Column(String, index=True, nullable=False)
+    tenant_id = Column(Integer, ForeignKey("tenant.id"), nullable=False)
+    message_id = Column(String, nullable=False)
     fake = Column(Boolean, nullable=False, default=False)
 
     category = relationship("Category", back_populates="bills")
     tenant = relationship("Tenant", back_populates="bills")
 
     @classmethod
-    def get_many(cls, session, tenant_id, date=None, date_range=None, category_id=None):
+    def _filters(cls, tenant_id, date=None, date_range=None, category_id=None):
         filters = [cls.tenant_id == tenant_id]
 
         if date is not None:
-            filters.append(cls.date == date)
+            filters.append(cls.date == parse_date(date))
 
         elif date_range is not None:
-            filters.append(cls.date.between(*date_range))
+            filters.append(cls.date.between(*map(parse_date, date_range)))
 
         if category_id is not None:
             filters.append(cls.category_id == category_id)
 
-        return session.execute(select(cls).where(and_(*filters))).scalars()
+        return and_(*filters)
+
+    @classmethod
+    async def get_many(
+        cls, session, tenant_id, date=None, date_range=None, category_id=None
+    ):
+        result = await session.execute(
+            select(cls).where(cls._filters(tenant_id, date, date_range, category_id))
+        )
+        return result.scalars()
+
+    @classmethod
+    async def sum_by_category(
+        cls, session, tenant_id, date=None, date_range=None, category_id=None
+    ):
+        """Return `(category_id, total, count)` rows for the period."""
+        result = await session.execute(
+            select(cls.category_id, func.sum(cls.value), func.count(cls.id))
+            .where(cls._filters(tenant_id, date, date_range, category_id))
+            .group_by(cls.category_id)
+            .order_by(func.sum(cls.value).desc())
+        )
+        return result.all()
+
+    @classmethod
+    async def sum_by_period(
+        cls,
+        session,
+        tenant_id,
+        unit,
+        date=None,
+        date_range=None,
+        category_id=None,
+    ):
+        """Return `(period start, total)` rows truncated to `unit` (week, month)."""
+        period = func.date_trunc(unit, cls.date)
+
+        result = await session.execute(
+            select(period, func.sum(cls.value))
+            .where(cls._filters(tenant_id, date, date_range, category_id))
+            .group_by(period)
+            .order_by(period)
+        )
+        return result.all()
+
+    @classmethod
+    async def get_top(
+        cls,
+        session,
+        tenant_id,
+        limit,
+        date=None,
+        date_range=None,
+        category_id=None,
+    ):
+        result = await session.execute(
+            select(cls)
+            .where(cls._filters(tenant_id, date, date_range, category_id))
+            .order_by(cls.value.desc())
+            .limit(limit)
+        )
+        return result.scalars()
 
     @classmethod
-    def get_by_message_id(cls, session, tenant_id, message_id):
-        return session.execute(
+    async def insert_many(cls, session, rows):
+        """Insert `rows` (dicts of columns) in as few multi-row INSERTs as possible."""
+        if rows:
+            await session.execute(bulk_insert(cls), rows)
+
+        return len(rows)
+
+    @classmethod
+    async def stream_with_category(
+        cls,
+        session,
+        tenant_id,
+        date=None,
+        date_range=None,
+        category_id=None,
+        batch_size=1000,
+    ):
+        """Yield `(date, value, category, original_prompt)` rows in date order.
+
+        Rows come from a server-side cursor `batch_size` at a time, so memory
+        does not depend on how many bills match.
+        """
+        result = await session.stream(
+            select(cls.date, cls.value, Category.name, cls.original_prompt)
+            .outerjoin(Category, cls.category_id == Category.id)
+            .where(cls._filters(tenant_id, date, date_range, category_id))
+            .order_by(cls.date, cls.id)
+            .execution_options(yield_per=batch_size)
+        )
+
+        async for row in result:
+            yield row
+
+    @classmethod
+    def _copy_columns(cls):
+        return [column.name for column in cls.__table__.columns if column.name != "id"]
+
+    @classmethod
+    async def copy_many(cls, session, rows, table=None):
+        """Write `rows` (dicts of columns) with COPY, for datasets too big to INSERT.
+
+        COPY runs on the session's connection, so it belongs to the current
+        transaction as long as something was already executed in it.
+        """
+        columns = cls._copy_columns()
+
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+
+        await raw_connection.driver_connection.copy_records_to_table(
+            table or cls.__tablename__,
+            columns=columns,
+            records=[tuple(row[column] for column in columns) for row in rows],
+        )
+
+        return len(rows)
+
+    @classmethod
+    async def import_many(cls, session, rows):
+        """Insert the `rows` whose message_id the tenant does not have yet.
+
+        Rows are COPYed into a temporary table and moved with an anti-join on
+        (tenant_id, message_id), so importing the same rows again is a no-op.
+        Imported message ids are also unique, a row another import inserted in
+        the meantime is skipped by ON CONFLICT. Returns the ids of the new bills.
+        """
+        columns = ", ".join(cls._copy_columns())
+
+        await session.execute(
+            text(
+                "CREATE TEMP TABLE IF NOT EXISTS bill_import ON COMMIT DELETE ROWS "
+                f"AS SELECT {columns} FROM bill WITH NO DATA"
+            )
+        )
+        await session.execute(text("TRUNCATE bill_import"))
+
+        await cls.copy_many(session, rows, table="bill_import")
+
+        result = await session.execute(
+            text(
+                f"INSERT INTO bill ({columns}) "
+                f"SELECT DISTINCT ON (message_id) {columns} FROM bill_import i "
+                "WHERE NOT EXISTS ("
+                "SELECT 1 FROM bill b "
+                "WHERE b.tenant_id = i.tenant_id AND b.message_id = i.message_id"
+                ") ON CONFLICT (tenant_id, message_id) "
+                f"WHERE message_id LIKE '{IMPORT_MESSAGE_ID_PREFIX}%' DO NOTHING "
+                "RETURNING id"
+            )
+        )
+        return result.scalars().all()
+
+    @classmethod
+    async def get_by_message_id(cls, session, tenant_id, message_id):
+        result = await session.execute(
             select(cls).where(cls.message_id == message_id, cls.tenant_id == tenant_id)
-        ).scalar_one_or_none()
+        )
+        return result.scalar_one_or_none()
+
+    @validates("date")
+    def validate_date(self, key, date):
+        return parse_date(date)
 
     def to_dict(self):
         return dict(
@@ -107,6 +316,89 @@ class Bill(DeclarativeBaseModel):
         )
 
 
+class BillDailyRollup(DeclarativeBaseModel):
+    """Bill totals per tenant, day and category.
+
+    Every write to `bill` must also go through `add_bills` so range sums can
+    read one row per day instead of every bill. Bills without a category are
+    rolled up under `category_id` 0.
+    """
+
+    __tablename__ = "bill_daily_rollup"
+
+    tenant_id = Column(Integer, ForeignKey("tenant.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    category_id = Column(Integer, primary_key=True)
+    total = Column(Float, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+
+    @classmethod
+    async def add_bills(cls, session, *filters, sign=1):
+        """Add the bills matching `filters` to the rollup, or subtract them with `sign=-1`.
+
+        Subtractions have to run before the bills are deleted.
+        """
+        # Inlined so the grouping expression matches the selected one
+        day = cast(Bill.date, Date)
+        category_id = func.coalesce(Bill.category_id, literal_column("0"))
+        sign = literal_column(str(int(sign)))
+
+        totals = (
+            select(
+                Bill.tenant_id,
+                day,
+                category_id,
+                sign * func.sum(Bill.value),
+                sign * func.count(Bill.id),
+            )
+            .where(*filters)
+            .group_by(Bill.tenant_id, day, category_id)
+        )
+
+        statement = insert(cls).from_select(
+            ["tenant_id", "day", "category_id", "total", "count"], totals
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[cls.tenant_id, cls.day, cls.category_id],
+            set_=dict(
+                total=cls.total + statement.excluded.total,
+                count=cls.count + statement.excluded.count,
+            ),
+        )
+
+        await session.execute(statement)
+
+    @classmethod
+    async def prune(cls, session, tenant_id):
+        await session.execute(
+            delete(cls).where(cls.tenant_id == tenant_id, cls.count <= 0)
+        )
+
+    @classmethod
+    async def rebuild(cls, session, tenant_id):
+        await session.execute(delete(cls).where(cls.tenant_id == tenant_id))
+        await cls.add_bills(session, Bill.tenant_id == tenant_id)
+
+    @classmethod
+    async def get_total(
+        cls, session, tenant_id, date=None, date_range=None, category_id=None
+    ):
+        filters = [cls.tenant_id == tenant_id]
+
+        if date is not None:
+            filters.append(cls.day == parse_date(date).date())
+
+        elif date_range is not None:
+            start, end = (parse_date(day).date() for day in date_range)
+            filters.append(cls.day.between(start, end))
+
+        if category_id is not None:
+            filters.append(cls.category_id == category_id)
+
+        result = await session.execute(select(func.sum(cls.total)).where(*filters))
+        return result.scalar() or 0
+
+
 class Tenant(DeclarativeBaseModel):
     __tablename__ = "tenant"
 
@@ -118,10 +410,9 @@ class Tenant(DeclarativeBaseModel):
     bills = relationship("Bill", back_populates="tenant")
 
     @classmethod
-    def get_by_id(cls, session, tenant_id):
-        return session.execute(
-            select(cls).where(cls.id == tenant_id)
-        ).scalar_one_or_none()
+    async def get_by_id(cls, session, tenant_id):
+        result = await session.execute(select(cls).where(cls.id == tenant_id))
+        return result.scalar_one_or_none()
 
 
 class User(DeclarativeBaseModel):
@@ -142,3 +433,77 @@ class User(DeclarativeBaseModel):
     )
 
     tenant = relationship("Tenant", back_populates="users")
+
+
+class Reminder(DeclarativeBaseModel):
+    __tablename__ = "reminder"
+    __table_args__ = (
+        # The scheduler only ever looks for active reminders that are due
+        Index(
+            "ix_reminder_next_fire_at",
+            "next_fire_at",
+            postgresql_where=text("active IS true"),
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    tenant_id = Column(Integer, ForeignKey("tenant.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("user_account.id"), nullable=False)
+    description = Column(String, nullable=False)
+    value = Column(Float, nullable=True)
+    recurrence = Column(Enum(ReminderRecurrence), nullable=False)
+    starts_at = Column(DateTime, nullable=False)
+    next_fire_at = Column(DateTime, nullable=False)
+    active = Column(Boolean, nullable=False, default=True)
+
+    user = relationship("User")
+
+    @classmethod
+    async def lock_due(cls, session, now, limit):
+        """Return up to `limit` due `(reminder, phone number)` rows, locked.
+
+        Rows locked by another scheduler are skipped rather than waited for.
+        """
+        result = await session.execute(
+            select(cls, User.phone_number)
+            .join(User, cls.user_id == User.id)
+            .where(cls.active.is_(True), cls.next_fire_at <= now)
+            .order_by(cls.next_fire_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True, of=cls)
+        )
+        return result.all()
+
+    @classmethod
+    async def get_active(cls, session, user_id):
+        result = await session.execute(
+            select(cls)
+            .where(cls.user_id == user_id, cls.active.is_(True))
+            .order_by(cls.id)
+        )
+        return result.scalars().all()
+
+    @classmethod
+    async def cancel(cls, session, user_id, reminder_id):
+        """Deactivate a reminder of the user and return it, None if not found."""
+        result = await session.execute(
+            update(cls)
+            .where(
+                cls.id == reminder_id,
+                cls.user_id == user_id,
+                cls.active.is_(True),
+            )
+            .values(active=False)
+            .returning(cls)
+        )
+        return result.scalar_one_or_none()
+
+    def advance(self, now):
+        next_fire_at = recurrence.next_occurrence(
+            self.recurrence.value, self.starts_at, now
+        )
+
+        if next_fire_at is None:
+            self.active = False
+        else:
+            self.next_fire_at = next_fire_at
@@ -37,3 +37,5 @@ class StepResult(BaseModel):
     next_step: Optional[str] = None
     waiting_for_response: bool = False
     quote_message: bool = False
+    static_message: bool = False
+    arguments: Optional[dict] = None
@@ -1,12 +1,17 @@
 import asyncio
+from contextlib import asynccontextmanager
 import json
+import os
+import time
 import traceback
 
 from src import util
+from src.amqp import AMQP_PREFETCH_COUNT
 from src.amqp import AMQP_RECEIVE_MESSAGE_QUEUE
 from src.amqp import amqp_client
+from src.database import async_redis_client
+from src.database import conversation_store
 from src.database import db_session_manager
-from src.database import redis_client
 from src.model import User
 from src.schema import ReceiveMessagePayload
 from src.service.conversation import ConversationManager
@@ -14,16 +19,34 @@ from src.service.conversation import ConversationManager
 import aio_pika
 from sqlalchemy import select
 
+MAX_CONCURRENT_MESSAGES = int(os.getenv("MAX_CONCURRENT_MESSAGES", 16))
+USER_LOCK_TIMEOUT = 30
+USER_LOCK_RETRY_INTERVAL = 0.2
+
 
 class MessageProcessor:
-    def __init__(self, session_factory):
+    def __init__(
+        self,
+        session_factory,
+        max_concurrent_messages=MAX_CONCURRENT_MESSAGES,
+        prefetch_count=AMQP_PREFETCH_COUNT,
+    ):
         self.session_factory = session_factory
-        self.redis_client = redis_client
+        self.redis_client = async_redis_client
+        self.conversation_store = conversation_store
         self.logger = util.Logger("message_processor")
         self.shutdown_event = asyncio.Event()
+        self.prefetch_count = prefetch_count
+        self.semaphore = asyncio.Semaphore(max_concurrent_messages)
+        # sender number -> [lock, number of messages waiting or running]
+        self.sender_queues = {}
 
     async def start(self):
-        await amqp_client.consume(AMQP_RECEIVE_MESSAGE_QUEUE, self._process_message)
+        await amqp_client.consume(
+            AMQP_RECEIVE_MESSAGE_QUEUE,
+            self._process_message,
+            prefetch_count=self.prefetch_count,
+        )
 
         self.logger.info("Started consuming messages")
 
@@ -36,75 +59,95 @@ class MessageProcessor:
 
         await asyncio.gather(
             amqp_client.close(),
-            asyncio.to_thread(self.redis_client.close()),
+            self.redis_client.close(),
         )
 
         self.logger.info("Shutdown complete")
 
     @util.time_execution(message="Time to process message: ")
     async def _process_message(self, message: aio_pika.IncomingMessage):
-        async with message.process():
-            message_data = json.loads(message.body)
-            message_payload = ReceiveMessagePayload(**message_data)
-
-            lock = f"user:{message_payload.sender_number}:lock"
-
-            logger_ctx_token = util.set_logger(message_payload.transaction_id)
-
-            if self.redis_client.acquire_lock(lock) is None:
-                self.logger.info(f"{message_payload.sender_number} locked")
-                return
+        try:
+            message_payload = ReceiveMessagePayload(**json.loads(message.body))
+        except (ValueError, TypeError) as e:
+            # Malformed messages would fail the same way on every redelivery
+            self.logger.error(f"Rejecting malformed message: {e!r}")
+            await message.reject(requeue=False)
+            return
+
+        async with message.process(requeue=True, ignore_processed=True):
+            # Messages from the same sender are handled one at a time and in the
+            # order they were delivered, different senders run concurrently.
+            async with self._sender_queue(message_payload.sender_number):
+                conversation = await self._bootstrap_conversation(
+                    message_payload.sender_number
+                )
+
+                if conversation is None:
+                    self.logger.info(
+                        f"{message_payload.sender_number} locked, requeueing"
+                    )
+                    await message.reject(requeue=True)
+                    return
 
-            try:
-                logger = util.get_logger()
-                logger.info("Got message")
-                logger.info("Checking state on redis")
+                # A slot is only taken once the user lock is held, so senders
+                # locked by another node do not hold up everyone else
+                async with self.semaphore:
+                    await self._handle_message(message_payload, conversation)
 
-                state = self._get_conversation_state(message_payload.sender_number)
+    async def _handle_message(self, message_payload, conversation):
+        phone_number = message_payload.sender_number
 
-                tokens_used = self._get_tokens_used(message_payload)
+        logger_ctx_token = util.set_logger(message_payload.transaction_id)
 
-                with db_session_manager() as session:
-                    conversation_manager = ConversationManager(
-                        message_payload, state, tokens_used
-                    )
+        committed = False
 
-                    tokens_used, state = await conversation_manager.process()
-                    session.commit()
+        try:
+            logger = util.get_logger()
+            logger.info("Got message")
 
-                logger.info("Saving session info on redis")
+            state, tokens_used = conversation
 
-                self._save_conversation_state(message_payload.sender_number, state)
+            async with db_session_manager():
+                conversation_manager = ConversationManager(
+                    message_payload, state, tokens_used
+                )
 
-                self._cache_token_usage(message_payload, tokens_used)
+                tokens_used, state = await conversation_manager.process()
 
-            except Exception:
-                traceback.print_exc()
+            logger.info("Saving session info on redis")
 
-            finally:
-                self.redis_client.release_lock(lock)
-                util.reset_logger(logger_ctx_token)
+            await self.conversation_store.commit(phone_number, state, tokens_used)
+            committed = True
 
-    def _get_tokens_used(self, message_payload):
-        token_usage_instances = self.redis_client.get_many(
-            f"user:{message_payload.sender_number}:token_usage:*"
-        )
+        except Exception:
+            traceback.print_exc()
 
-        tokens_used = 0
+        finally:
+            if not committed:
+                await self.redis_client.release_lock(f"user:{phone_number}:lock")
+            util.reset_logger(logger_ctx_token)
 
-        for token_usage_instance in token_usage_instances:
-            tokens_used += int(token_usage_instance)
+    @asynccontextmanager
+    async def _sender_queue(self, sender_number):
+        queue = self.sender_queues.setdefault(sender_number, [asyncio.Lock(), 0])
+        queue[1] += 1
+        try:
+            async with queue[0]:
+                yield
+        finally:
+            queue[1] -= 1
+            if queue[1] == 0:
+                del self.sender_queues[sender_number]
 
-        return tokens_used
-
-    def _cache_token_usage(self, message_payload, tokens_used):
-        self.redis_client.set(
-            f"user:{message_payload.sender_number}:token_usage:{message_payload.transaction_id}",
-            tokens_used,
-        )
+    async def _bootstrap_conversation(self, phone_number):
+        # Another node may still be handling a message from the same sender
+        deadline = time.monotonic() + USER_LOCK_TIMEOUT
+        while True:
+            conversation = await self.conversation_store.bootstrap(
+                phone_number, USER_LOCK_TIMEOUT
+            )
 
-    def _save_conversation_state(self, phone_number, state):
-        self.redis_client.set(f"user:{phone_number}:state", state)
+            if conversation is not None or time.monotonic() >= deadline:
+                return conversation
 
-    def _get_conversation_state(self, phone_number):
-        return self.redis_client.get(f"user:{phone_number}:state", {})
+            await asyncio.sleep(USER_LOCK_RETRY_INTERVAL)
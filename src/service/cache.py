@@ -0,0 +1,76 @@
+import os
+
+from src.lib.category_index import CategoryIndex
+from src.model import Category
+from src.model import User
+
+from cachetools import TTLCache
+from sqlalchemy import inspect
+from sqlalchemy import select
+from sqlalchemy.orm import make_transient_to_detached
+
+CACHE_TTL = int(os.getenv("CACHE_TTL", 60))
+CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", 10000))
+
+user_cache = TTLCache(maxsize=CACHE_MAX_SIZE, ttl=CACHE_TTL)
+categories_cache = TTLCache(maxsize=CACHE_MAX_SIZE, ttl=CACHE_TTL)
+category_index_cache = TTLCache(maxsize=CACHE_MAX_SIZE, ttl=CACHE_TTL)
+
+
+def _detached_copy(user):
+    copy = User(
+        **{
+            attribute.key: getattr(user, attribute.key)
+            for attribute in inspect(User).column_attrs
+        }
+    )
+    make_transient_to_detached(copy)
+    return copy
+
+
+async def get_user(session, phone_number):
+    if (user := user_cache.get(phone_number)) is not None:
+        # Attach a copy to the session without emitting a SELECT, changes made
+        # during the message never touch the cached instance.
+        return await session.merge(user, load=False)
+
+    result = await session.execute(
+        select(User).where(User.phone_number == phone_number)
+    )
+    user = result.scalar_one_or_none()
+
+    if user is not None:
+        user_cache[phone_number] = _detached_copy(user)
+
+    return user
+
+
+def invalidate_user(phone_number):
+    user_cache.pop(phone_number, None)
+
+
+async def get_categories(session, tenant_id):
+    if (categories := categories_cache.get(tenant_id)) is not None:
+        return categories
+
+    categories = [
+        category.to_dict() for category in await Category.get_all(session, tenant_id)
+    ]
+    categories_cache[tenant_id] = categories
+
+    return categories
+
+
+async def get_category_index(session, tenant_id):
+    if (index := category_index_cache.get(tenant_id)) is not None:
+        return index
+
+    index = CategoryIndex(await get_categories(session, tenant_id))
+    category_index_cache[tenant_id] = index
+
+    return index
+
+
+def invalidate_categories(tenant_id):
+    categories_cache.pop(tenant_id, None)
+    category_index_cache.pop(tenant_id, None)
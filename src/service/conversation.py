@@ -6,12 +6,11 @@ from src import database
 from src import util
 from src.amqp import AMQP_SEND_MESSAGE_QUEUE
 from src.amqp import amqp_client
-from src.model import User
+from src.lib.governor import CircuitOpenError
 from src.schema import SendMessagePayload
+from src.service import cache
 from src.service.step import Step
 
-from sqlalchemy import select
-
 
 class ConversationManager:
     def __init__(self, message_payload=None, state={}, tokens_used=0):
@@ -22,13 +21,17 @@ class ConversationManager:
 
         self.tokens_used = tokens_used
 
-        self.user = self.session.execute(
-            select(User).where(User.phone_number == message_payload.sender_number)
-        ).scalar()
+        self.user = None
 
     async def process(self):
         try:
+            self.user = await cache.get_user(
+                self.session, self.message_payload.sender_number
+            )
+
             if self.user is not None:
+                util.set_tenant_id(self.user.tenant_id)
+
                 if self.tokens_used >= self.user.tokens_per_hour:
                     await self._send_message(
                         f"Limite de tokens de {self.user.tokens_per_hour} por hora "
@@ -56,9 +59,15 @@ class ConversationManager:
                     self.log.error(f"Unknown step: {result.next_step}")
                     break
 
-                step = step_class(self.user, self.state)
+                step = self._create_step(step_class, result.arguments)
 
             return tokens_used, self.state
+        except CircuitOpenError:
+            self.log.error("LLM circuit open, sending degraded reply")
+            await self._send_message(
+                "Estou com dificuldades para processar mensagens agora. "
+                "Tente novamente em alguns minutos."
+            )
         except Exception:
             traceback.print_exc()
             await self._send_message("Ocorreu um erro ao processar sua solicitação.")
@@ -69,11 +78,16 @@ class ConversationManager:
         if next_step:
             step_class = Step.registry.get(next_step)
             if step_class:
-                return step_class(self.user, self.state)
+                return self._create_step(step_class)
             else:
                 self.log.info(f"Unknown next step: {next_step}, defaulting to Unknown")
 
-        return Step.registry["InitialHandler"](self.user, self.state)
+        return self._create_step(Step.registry["InitialHandler"])
+
+    def _create_step(self, step_class, arguments=None):
+        return step_class(
+            self.user, self.state, arguments, send_message=self._send_message
+        )
 
     async def _send_message(self, message_body, must_quote_message=False):
         quoted_message_id = None
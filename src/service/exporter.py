@@ -0,0 +1,90 @@
+import csv
+import json
+import os
+import time
+import uuid
+
+from src.model import Bill
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+EXPORT_RETENTION_DAYS = float(os.getenv("EXPORT_RETENTION_DAYS", 7))
+EXPORT_FORMATS = ("csv", "jsonl")
+
+EXPORT_FIELDS = ("date", "value", "category", "description")
+
+
+def _csv_writer(file):
+    writer = csv.writer(file)
+    writer.writerow(EXPORT_FIELDS)
+    return writer.writerow
+
+
+def _jsonl_writer(file):
+    def write(row):
+        file.write(json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False))
+        file.write("\n")
+
+    return write
+
+
+WRITERS = dict(csv=_csv_writer, jsonl=_jsonl_writer)
+
+
+async def export_bills(session, tenant_id, file, file_format, **filters):
+    """Write a tenant's bills to `file` as CSV or JSON Lines.
+
+    `filters` are the period and category filters of `Bill.get_many`. Returns
+    `(count, total)` of the exported bills.
+    """
+    write = WRITERS[file_format](file)
+    count = 0
+    total = 0.0
+
+    async for date, value, category, description in Bill.stream_with_category(
+        session, tenant_id, batch_size=EXPORT_BATCH_SIZE, **filters
+    ):
+        write((date.strftime("%Y-%m-%d"), value, category, description))
+        count += 1
+        total += value
+
+    return count, total
+
+
+def cleanup_exports(max_age=EXPORT_RETENTION_DAYS * 86400):
+    """Delete the files in `EXPORT_DIR` older than `max_age` seconds.
+
+    Returns how many files were deleted.
+    """
+    if not os.path.isdir(EXPORT_DIR):
+        return 0
+
+    cutoff = time.time() - max_age
+    deleted = 0
+
+    with os.scandir(EXPORT_DIR) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                deleted += 1
+
+    return deleted
+
+
+async def export_to_file(session, tenant_id, file_format, **filters):
+    """Export to a new file in `EXPORT_DIR` and return `(path, count, total)`.
+
+    Files older than `EXPORT_RETENTION_DAYS` are deleted first, so the
+    directory does not grow with every export.
+    """
+    cleanup_exports()
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+
+    path = os.path.join(EXPORT_DIR, f"{tenant_id}-{uuid.uuid4().hex}.{file_format}")
+
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        count, total = await export_bills(
+            session, tenant_id, file, file_format, **filters
+        )
+
+    return path, count, total
@@ -0,0 +1,220 @@
+import hashlib
+import itertools
+import os
+import time
+
+from src import util
+from src.lib import ai
+from src.lib import nlp
+from src.lib import statement
+from src.lib.category_index import CategoryIndex
+from src.model import IMPORT_MESSAGE_ID_PREFIX
+from src.model import Bill
+from src.model import BillDailyRollup
+from src.model import Category
+
+from cachetools import LRUCache
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", 5000))
+IMPORT_AI_BATCH_SIZE = int(os.getenv("IMPORT_AI_BATCH_SIZE", 100))
+IMPORT_CATEGORY_CACHE_SIZE = int(os.getenv("IMPORT_CATEGORY_CACHE_SIZE", 10000))
+IMPORT_ROLLUP_BATCH_SIZE = 10000
+
+
+def _transaction_key(transaction):
+    return transaction["reference"] or (
+        f"{transaction['value']:.2f}|{transaction['description']}"
+    )
+
+
+def _day_message_ids(tenant_id, day_transactions):
+    # Sorted so the ids do not depend on the order the bank listed the day in
+    day_transactions.sort(
+        key=lambda transaction: (
+            _transaction_key(transaction),
+            transaction["value"],
+            transaction["description"],
+        )
+    )
+
+    for key, group in itertools.groupby(day_transactions, key=_transaction_key):
+        for occurrence, transaction in enumerate(group, start=1):
+            digest = hashlib.sha1(
+                f"{tenant_id}|{transaction['date']:%Y-%m-%d}|{key}|{occurrence}".encode()
+            ).hexdigest()
+
+            yield {**transaction, "message_id": f"{IMPORT_MESSAGE_ID_PREFIX}{digest}"}
+
+
+def _message_ids(tenant_id, transactions):
+    """Yield each transaction with a message_id derived from its content.
+
+    Identical transactions on the same day are told apart by their occurrence
+    within the day. Only one day is buffered at a time, so the statement must
+    list each day's transactions together, like bank statements do in either
+    date order.
+    """
+    finished_dates = set()
+    day_transactions = []
+
+    for transaction in transactions:
+        if day_transactions and transaction["date"] != day_transactions[0]["date"]:
+            finished_dates.add(day_transactions[0]["date"])
+            yield from _day_message_ids(tenant_id, day_transactions)
+            day_transactions = []
+
+        if transaction["date"] in finished_dates:
+            raise ValueError(
+                f"Transactions of {transaction['date']:%Y-%m-%d} are not listed "
+                "together, sort the statement by date"
+            )
+
+        day_transactions.append(transaction)
+
+    yield from _day_message_ids(tenant_id, day_transactions)
+
+
+class StatementImporter:
+    """Import the expenses of a bank statement as bills of a tenant.
+
+    The statement is streamed in chunks of `chunk_size` transactions. Each chunk
+    is categorized with the tenant's category index, with a single LLM call per
+    `IMPORT_AI_BATCH_SIZE` descriptions the index could not place, then written
+    with COPY and committed, so memory does not grow with the file and an
+    interrupted import can simply be run again.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        tenant_id,
+        expenses="negative",
+        use_ai=True,
+        chunk_size=IMPORT_CHUNK_SIZE,
+        log=None,
+    ):
+        self.session_factory = session_factory
+        self.tenant_id = tenant_id
+        self.expenses = expenses
+        self.use_ai = use_ai
+        self.chunk_size = chunk_size
+        self.log = log or util.get_logger()
+        self.category_cache = LRUCache(maxsize=IMPORT_CATEGORY_CACHE_SIZE)
+        self.tokens_used = 0
+
+    def _is_expense(self, transaction):
+        if self.expenses == "negative":
+            return transaction["value"] < 0
+
+        return transaction["value"] > 0
+
+    async def _load_categories(self):
+        async with self.session_factory() as session:
+            categories = [
+                category.to_dict()
+                for category in await Category.get_all(session, self.tenant_id)
+            ]
+
+        if not categories:
+            raise ValueError(f"Tenant {self.tenant_id} has no categories")
+
+        default_name = nlp.normalize(Category.DEFAULT_CATEGORY["name"])
+        self.default_category_id = next(
+            (
+                category["id"]
+                for category in categories
+                if nlp.normalize(category["name"]) == default_name
+            ),
+            categories[0]["id"],
+        )
+        self.category_ids = {category["id"] for category in categories}
+        self.categories = categories
+        self.category_index = CategoryIndex(categories)
+
+    async def _categorize(self, descriptions):
+        pending = []
+        for description in descriptions:
+            if description in self.category_cache:
+                continue
+
+            if (category_id := self.category_index.match(description)) is not None:
+                self.category_cache[description] = category_id
+            else:
+                pending.append(description)
+
+        for batch in statement.chunked(pending, IMPORT_AI_BATCH_SIZE):
+            answer = {}
+            if self.use_ai:
+                tokens, answer = await ai.get_bills_categories(batch, self.categories)
+                self.tokens_used += tokens
+
+            for position, description in enumerate(batch):
+                category_id = answer.get(position)
+                if category_id not in self.category_ids:
+                    category_id = self.default_category_id
+
+                self.category_cache[description] = category_id
+
+        return {
+            description: self.category_cache.get(description, self.default_category_id)
+            for description in descriptions
+        }
+
+    async def _import_chunk(self, transactions):
+        categories = await self._categorize(
+            {transaction["description"] for transaction in transactions}
+        )
+
+        rows = [
+            dict(
+                value=abs(transaction["value"]),
+                date=transaction["date"],
+                original_prompt=transaction["description"],
+                category_id=categories[transaction["description"]],
+                tenant_id=self.tenant_id,
+                message_id=transaction["message_id"],
+                fake=False,
+            )
+            for transaction in transactions
+        ]
+
+        async with self.session_factory() as session:
+            bill_ids = await Bill.import_many(session, rows)
+
+            # Batched, asyncpg takes at most 32767 parameters per statement
+            for batch in statement.chunked(bill_ids, IMPORT_ROLLUP_BATCH_SIZE):
+                await BillDailyRollup.add_bills(session, Bill.id.in_(batch))
+
+            await session.commit()
+
+        return len(bill_ids)
+
+    async def run(self, file, file_format):
+        """Import `file` and return `(transactions read, bills created)`."""
+        util.set_tenant_id(self.tenant_id)
+
+        await self._load_categories()
+
+        started = time.perf_counter()
+        read = 0
+        imported = 0
+
+        expenses = (
+            transaction
+            for transaction in statement.read_statement(file, file_format)
+            if self._is_expense(transaction)
+        )
+
+        for chunk in statement.chunked(
+            _message_ids(self.tenant_id, expenses), self.chunk_size
+        ):
+            read += len(chunk)
+            imported += await self._import_chunk(chunk)
+
+            self.log.info(
+                f"Read {read} expenses, imported {imported}, skipped "
+                f"{read - imported} already imported "
+                f"({read / (time.perf_counter() - started):.0f} rows/s)"
+            )
+
+        return read, imported
@@ -0,0 +1,196 @@
+import asyncio
+import os
+import traceback
+import uuid
+
+from src import util
+from src.database import async_redis_client
+from src.model import User
+from src.service.conversation import send_message
+
+from sqlalchemy import and_
+from sqlalchemy import select
+from sqlalchemy import update
+
+NOTIFICATION_BATCH_SIZE = int(os.getenv("NOTIFICATION_BATCH_SIZE", 500))
+NOTIFICATION_CONCURRENCY = int(os.getenv("NOTIFICATION_CONCURRENCY", 20))
+NOTIFICATION_RETRY_INTERVAL = float(os.getenv("NOTIFICATION_RETRY_INTERVAL", 300))
+NOTIFICATION_LOCK_KEY = "version_notification:lock"
+# Refreshed after every batch, only has to outlive a single batch
+NOTIFICATION_LOCK_TIMEOUT = 600
+
+
+def format_changelog(changelog):
+    text = ""
+    for i in range(len(changelog)):
+        text += f"{i + 1}. {changelog[i]};\n"
+
+    return text
+
+
+def format_version_message(version_data):
+    return (
+        f"Nova atualização! Versão *{version_data['version']}*\n\n"
+        "*Novas funcionalidades*\n"
+        f"{format_changelog(version_data['changelog'])}\n\n"
+        "Se você não deseja mais receber esse tipo de notificação, "
+        "é só me dizer!"
+    )
+
+
+class VersionNotifier:
+    """Tells users about the versions released since they were last notified.
+
+    Runs in the background while messages are already being consumed. Users are
+    streamed in batches with `yield_per` and each batch is sent with bounded
+    concurrency and committed right away, so a restart resumes from the users
+    that were not notified yet. A Redis lock keeps a single worker doing it.
+    The lock holds a token of the run and is refreshed after every batch, a
+    worker that did not get it, or lost it, tries again every
+    `retry_interval` until a run goes through, so the fanout resumes once a
+    crashed worker's lock expires.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        batch_size=NOTIFICATION_BATCH_SIZE,
+        concurrency=NOTIFICATION_CONCURRENCY,
+        retry_interval=NOTIFICATION_RETRY_INTERVAL,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.redis_client = async_redis_client
+        self.logger = util.Logger("version_notifier")
+        self.shutdown_event = asyncio.Event()
+        self.running = asyncio.Lock()
+        # last_version_notified -> messages to send, built once per version
+        self.messages = {}
+
+    async def run(self):
+        while not self.shutdown_event.is_set():
+            async with self.running:
+                done = await self._run_once()
+
+            if done:
+                return
+
+            try:
+                await asyncio.wait_for(
+                    self.shutdown_event.wait(), timeout=self.retry_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_once(self):
+        """Notify everyone pending, return whether the run went through."""
+        token = uuid.uuid4().hex
+
+        if not await self.redis_client.acquire_lock(
+            NOTIFICATION_LOCK_KEY, timeout=NOTIFICATION_LOCK_TIMEOUT, token=token
+        ):
+            self.logger.info("Version notification already running elsewhere")
+            return False
+
+        try:
+            done, notified = await self._notify_users(token)
+            self.logger.info(f"Notified {notified} users about new versions")
+            return done
+
+        except Exception:
+            self.logger.error(f"Error notifying users: {traceback.format_exc()}")
+            return False
+
+        finally:
+            await self.redis_client.release_lock(NOTIFICATION_LOCK_KEY, token=token)
+
+    async def close(self):
+        self.shutdown_event.set()
+
+        # Let the batch in progress finish committing
+        async with self.running:
+            pass
+
+    def _get_messages(self, last_version_notified):
+        if last_version_notified not in self.messages:
+            self.messages[last_version_notified] = [
+                format_version_message(version_data)
+                for version_data in util.get_version_changes(last_version_notified)
+            ]
+
+        return self.messages[last_version_notified]
+
+    async def _notify_users(self, token):
+        """Return whether every batch was sent and how many users were notified."""
+        current_version = util.get_current_version()
+        notified = 0
+
+        async with self.session_factory() as session:
+            result = await session.stream(
+                select(User.id, User.phone_number, User.last_version_notified)
+                .where(
+                    and_(
+                        User.last_version_notified < current_version,
+                        User.send_notification.is_(True),
+                    )
+                )
+                .order_by(User.id)
+                .execution_options(yield_per=self.batch_size)
+            )
+
+            async for batch in result.partitions():
+                if self.shutdown_event.is_set():
+                    return False, notified
+
+                notified += await self._notify_batch(batch)
+
+                if not await self.redis_client.refresh_lock(
+                    NOTIFICATION_LOCK_KEY, token, timeout=NOTIFICATION_LOCK_TIMEOUT
+                ):
+                    self.logger.error("Lost the version notification lock")
+                    return False, notified
+
+        return True, notified
+
+    async def _notify_batch(self, users):
+        results = await asyncio.gather(*(self._notify_user(*user) for user in users))
+
+        # last_version_notified before -> after -> ids of the users notified
+        updates = {}
+        for (user_id, _, last_version_notified), sent in zip(users, results):
+            if sent:
+                versions = len(self._get_messages(last_version_notified))
+                key = (last_version_notified, last_version_notified + versions)
+                updates.setdefault(key, []).append(user_id)
+
+        async with self.session_factory() as session:
+            for (before, after), user_ids in updates.items():
+                # Only moves users still on the version they were notified from
+                await session.execute(
+                    update(User)
+                    .where(User.id.in_(user_ids), User.last_version_notified == before)
+                    .values(last_version_notified=after)
+                )
+
+            await session.commit()
+
+        notified = sum(len(user_ids) for user_ids in updates.values())
+        self.logger.info(f"Notified a batch of {notified} users")
+
+        return notified
+
+    async def _notify_user(self, user_id, phone_number, last_version_notified):
+        async with self.semaphore:
+            try:
+                for message in self._get_messages(last_version_notified):
+                    await send_message(message, phone_number=phone_number)
+
+                return True
+
+            except Exception:
+                self.logger.error(
+                    f"Error notifying user {user_id}: {traceback.format_exc()}"
+                )
+                return False
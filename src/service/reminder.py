@@ -0,0 +1,132 @@
+import asyncio
+from datetime import datetime
+import json
+import os
+import traceback
+
+from src import util
+from src.amqp import AMQP_SEND_MESSAGE_QUEUE
+from src.amqp import amqp_client
+from src.database import async_redis_client
+from src.model import Reminder
+from src.schema import SendMessagePayload
+
+REMINDER_POLL_INTERVAL = float(os.getenv("REMINDER_POLL_INTERVAL", 30))
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", 500))
+REMINDER_HOUR = int(os.getenv("REMINDER_HOUR", 9))
+REMINDER_FIRED_EXPIRATION = 7 * 24 * 3600
+
+
+def format_reminder(reminder):
+    message = f"*Lembrete*: {reminder.description}"
+
+    if reminder.value is not None:
+        message += f"\nValor: *R${reminder.value:.2f}*"
+
+    return message
+
+
+class ReminderScheduler:
+    """Publishes due reminders to the send queue.
+
+    Due reminders are read through the partial index on `next_fire_at`, a batch
+    at a time and locked with SKIP LOCKED, so several workers can run the
+    scheduler and none of them scans the whole table. Each occurrence is marked
+    as fired in Redis before it is published, so a reminder picked up again
+    after a crash, before its new `next_fire_at` was committed, is not sent twice.
+    The mark is removed again when publishing fails, so the occurrence is
+    retried instead of skipped.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        poll_interval=REMINDER_POLL_INTERVAL,
+        batch_size=REMINDER_BATCH_SIZE,
+    ):
+        self.session_factory = session_factory
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.redis_client = async_redis_client
+        self.logger = util.Logger("reminder_scheduler")
+        self.shutdown_event = asyncio.Event()
+        self.running = asyncio.Lock()
+
+    async def start(self):
+        self.logger.info("Started reminder scheduler")
+
+        while not self.shutdown_event.is_set():
+            try:
+                async with self.running:
+                    # Keep going while full batches come back, to catch up on backlogs
+                    while (
+                        not self.shutdown_event.is_set()
+                        and await self._fire_due() == self.batch_size
+                    ):
+                        pass
+
+            except Exception:
+                self.logger.error(f"Error firing reminders: {traceback.format_exc()}")
+
+            try:
+                await asyncio.wait_for(
+                    self.shutdown_event.wait(), timeout=self.poll_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    async def close(self):
+        self.shutdown_event.set()
+
+        # Let the batch in progress finish committing
+        async with self.running:
+            self.logger.info("Reminder scheduler stopped")
+
+    async def _fire_due(self):
+        now = datetime.now()
+
+        async with self.session_factory() as session:
+            due = await Reminder.lock_due(session, now, self.batch_size)
+
+            if not due:
+                return 0
+
+            await asyncio.gather(
+                *(
+                    self._publish(reminder, phone_number)
+                    for reminder, phone_number in due
+                )
+            )
+
+            for reminder, _ in due:
+                reminder.advance(now)
+
+            await session.commit()
+
+        self.logger.info(f"Fired {len(due)} reminders")
+
+        return len(due)
+
+    async def _publish(self, reminder, phone_number):
+        fire_id = f"reminder:{reminder.id}:{reminder.next_fire_at:%Y%m%d%H%M}"
+
+        if not await self.redis_client.acquire_lock(
+            fire_id, timeout=REMINDER_FIRED_EXPIRATION
+        ):
+            return
+
+        payload = SendMessagePayload(
+            message_type="text",
+            recipient_number=phone_number,
+            message_body=format_reminder(reminder),
+            transaction_id=fire_id,
+        )
+
+        try:
+            await amqp_client.publish(
+                json.dumps(payload.model_dump()), AMQP_SEND_MESSAGE_QUEUE
+            )
+        except BaseException:
+            # Not sent, the occurrence must fire again on the next poll
+            await self.redis_client.delete(fire_id)
+            raise
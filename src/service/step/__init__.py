@@ -1,7 +1,7 @@
 from datetime import datetime
 from datetime import timedelta
+import functools
 import json
-import random
 import re
 from typing import ClassVar
 import uuid
@@ -9,35 +9,53 @@ import uuid
 from src import database
 from src import util
 from src.amqp import AMQP_SEND_MESSAGE_QUEUE
+from src.database import token_budget
 from src.lib import ai
+from src.lib import extract
+from src.lib import fake_bills
+from src.lib import nlp
+from src.lib.mood import mood_renderer
 from src.model import Bill
+from src.model import BillDailyRollup
 from src.model import BillyMood
 from src.model import Category
+from src.model import Reminder
+from src.model import ReminderRecurrence
 from src.model import Tenant
 from src.model import User
 from src.schema import SendMessagePayload
 from src.schema import StepResult
 from src.service import amqp_client
-from src.service import redis_client
+from src.service import async_redis_client
+from src.service import cache
+from src.service.reminder import REMINDER_HOUR
 
 from sqlalchemy import and_
 from sqlalchemy import delete
-from sqlalchemy import func
-from sqlalchemy import select
-
-SOON_MESSAGE = "Ainda não tenho essa funcionalidade. Mas logo logo estará disponível."
 
 
 class Step:
     registry: ClassVar = {}
+    # (regex over the normalized message, confidence) pairs used to route
+    # messages to this step without asking the LLM
+    intent_patterns: ClassVar = ()
+    # Key of the INTENT_WITH_ARGUMENTS response holding this step's arguments
+    intent_arguments: ClassVar = None
 
     def __init_subclass__(cls, **kwargs):
         super().__init_subclass__(**kwargs)
         Step.registry[cls.__name__] = cls
+        cls.intent_rules = [
+            (re.compile(pattern), confidence)
+            for pattern, confidence in cls.intent_patterns
+        ]
 
-    def __init__(self, user, state):
+    def __init__(self, user, state, arguments=None, send_message=None):
         self.user = user
         self.state = state
+        self.arguments = arguments or {}
+        # Publishes a message right away, for steps that answer in parts
+        self.send_message = send_message
         self.session = database.get_db_session()
         self.log = util.get_logger()
 
@@ -50,8 +68,8 @@ class Step:
             and self.user
             and self.user.billy_mood != BillyMood.NEUTRAL
         ):
-            tokens_used, message = await ai.get_billy_mood_response(
-                result.message, self.user.billy_mood.value
+            tokens_used, message = await mood_renderer.render(
+                result.message, self.user.billy_mood.value, result.static_message
             )
 
             result.tokens_used += tokens_used
@@ -67,12 +85,19 @@ class Step:
 
 
 class WaitingStep(Step):
+    # Whether the question is the same for every user and can reuse cached
+    # mood rewrites
+    static_question: ClassVar = True
+
     async def _process(self, message_payload):
         message = self.question
         next_step = self.next_step
 
         return StepResult(
-            message=message, next_step=next_step, waiting_for_response=True
+            message=message,
+            next_step=next_step,
+            waiting_for_response=True,
+            static_message=self.static_question,
         )
 
     @property
@@ -112,7 +137,7 @@ class BeginRegistration(Step):
             "Para continuar, preciso fazer seu cadastro."
         )
 
-        return StepResult(message=message, next_step="AskUserName")
+        return StepResult(message=message, next_step="AskUserName", static_message=True)
 
 
 class AskUserConsent(WaitingStep):
@@ -127,7 +152,9 @@ class AskUserConsent(WaitingStep):
 
 class CheckUserConsent(Step):
     async def _process(self, message_payload):
-        tokens, confirmation = ai.get_yes_or_no_answer(message_payload.body)
+        tokens, confirmation = await ai.get_yes_or_no_answer(
+            message_payload.message_body
+        )
 
         next_step = "AskUserName" if confirmation else "SayGoodbye"
 
@@ -139,12 +166,17 @@ class CheckUserConsent(Step):
             message = "Tudo bem, então. Se mudar de ideia, estarei aqui!"
             next_step = "SayGoodbye"
 
-        return StepResult(tokens_used=tokens, message=message, next_step=next_step)
+        return StepResult(
+            tokens_used=tokens,
+            message=message,
+            next_step=next_step,
+            static_message=True,
+        )
 
 
 class SayGoodbye(TerminalStep):
     async def _process(self, message_payload):
-        return StepResult(message="Até mais!")
+        return StepResult(message="Até mais!", static_message=True)
 
 
 class AskUserName(WaitingStep):
@@ -218,7 +250,7 @@ class ProcessUserRegisterFakeBills(Step):
 class RegisterUser(TerminalStep):
     async def _process(self, message_payload):
         if tenant_id := self.state.get("tenant_id", None):
-            tenant = Tenant.get_by_id(self.session, tenant_id)
+            tenant = await Tenant.get_by_id(self.session, tenant_id)
 
             if tenant is None:
                 raise ValueError("Tenant not found")
@@ -231,8 +263,8 @@ class RegisterUser(TerminalStep):
 
             tenant = Tenant()
             self.session.add(tenant)
-            self.session.flush()
-            self.session.refresh(tenant)
+            await self.session.flush()
+            await self.session.refresh(tenant)
 
             categories = [
                 Category(
@@ -253,12 +285,12 @@ class RegisterUser(TerminalStep):
                 )
 
             self.session.add_all(categories)
-            self.session.flush()
+            await self.session.flush()
 
             if register_fake_bills:
                 self.log.info("Registering fake bills")
 
-                total = _register_fake_bills(
+                total = await _register_fake_bills(
                     categories, message_payload.message_id, tenant, self.session
                 )
 
@@ -276,8 +308,10 @@ class RegisterUser(TerminalStep):
         )
 
         self.session.add(user)
-        self.session.flush()
-        self.session.refresh(user)
+        await self.session.flush()
+        await self.session.refresh(user)
+
+        cache.invalidate_user(user.phone_number)
 
         title = "*Registro concluído com sucesso!*"
 
@@ -322,6 +356,8 @@ class SaveTenantMemberNumber(Step):
 
 
 class CheckTenantMemberNumber(WaitingStep):
+    static_question = False
+
     @property
     def question(self):
         phone_number = self.state["phone_number"]
@@ -411,7 +447,7 @@ async def invite_tenant_member(phone_number, inviter):
         json.dumps(message_payload.model_dump()), AMQP_SEND_MESSAGE_QUEUE
     )
 
-    redis_client.set(f"user:{phone_number}:state", state)
+    await async_redis_client.set(f"user:{phone_number}:state", state)
 
 
 class HandleTenantInvitation(Step):
@@ -435,20 +471,63 @@ class HandleTenantInvitation(Step):
 
 class HandleUserIntent(Step):
     async def _process(self, message_payload):
-        system_prompt = (
-            "Você é um assistente que ajuda a descobrir a intenção de uma mensagem. "
-            "Estes são os possíveis conteúdos da mensagem e o que deve ser retornado"
+        user_intent = nlp.classify_intent(
+            message_payload.message_body, _get_intent_rules()
         )
-        for class_name, cls in Step.registry.items():
-            if hasattr(cls, "intent_description"):
-                system_prompt += f"\n{cls.intent_description}: '{class_name}'"
+
+        if user_intent is not None:
+            self.log.info(f"Intent matched locally: {user_intent}")
+            return StepResult(next_step=user_intent)
+
+        if ai.FUSED_INTENT:
+            return await self._get_intent_with_arguments(message_payload)
 
         tokens, user_intent = await ai.get_user_intent(
-            message_payload.message_body, system_prompt
+            message_payload.message_body, _get_intent_system_prompt()
         )
 
         return StepResult(tokens_used=tokens, next_step=user_intent)
 
+    async def _get_intent_with_arguments(self, message_payload):
+        categories = await cache.get_categories(self.session, self.user.tenant_id)
+
+        tokens, intent_value = await ai.get_user_intent_with_arguments(
+            message_payload.message_body, _get_intent_system_prompt(), categories
+        )
+
+        user_intent = intent_value["intent"]
+        arguments = None
+
+        if (step_class := Step.registry.get(user_intent)) is not None:
+            if step_class.intent_arguments is not None:
+                arguments = intent_value.get(step_class.intent_arguments)
+
+        return StepResult(
+            tokens_used=tokens, next_step=user_intent, arguments=arguments
+        )
+
+
+@functools.cache
+def _get_intent_system_prompt():
+    system_prompt = (
+        "Você é um assistente que ajuda a descobrir a intenção de uma mensagem. "
+        "Estes são os possíveis conteúdos da mensagem e o que deve ser retornado"
+    )
+    for class_name, cls in Step.registry.items():
+        if hasattr(cls, "intent_description"):
+            system_prompt += f"\n{cls.intent_description}: '{class_name}'"
+
+    return system_prompt
+
+
+@functools.cache
+def _get_intent_rules():
+    return {
+        class_name: cls.intent_rules
+        for class_name, cls in Step.registry.items()
+        if hasattr(cls, "intent_description") and cls.intent_rules
+    }
+
 
 class RegisterBill(TerminalStep):
     intent_description = (
@@ -458,15 +537,15 @@ class RegisterBill(TerminalStep):
         "'registre uma despesa de 10,50 em cachorro quente'"
         "'fiz uma compra no valor de 105 reais de um curso'"
     )
+    intent_arguments = "bill"
 
     async def _process(self, message_payload):
-        categories = [
-            category.to_dict()
-            for category in Category.get_all(self.session, self.user.tenant_id)
-        ]
+        category_index = await cache.get_category_index(
+            self.session, self.user.tenant_id
+        )
 
-        tokens, bill_to_register = await ai.get_bill_to_register(
-            message_payload.message_body, categories
+        tokens, bill_to_register = await self._get_bill_to_register(
+            message_payload.message_body, category_index
         )
 
         bill = Bill(
@@ -479,19 +558,76 @@ class RegisterBill(TerminalStep):
         )
 
         self.session.add(bill)
-        self.session.flush()
+        await self.session.flush()
+
+        await BillDailyRollup.add_bills(self.session, Bill.id == bill.id)
+
+        category = await bill.awaitable_attrs.category
 
         message = util.create_whatsapp_aligned_text(
             "Despesa registrada",
             {
                 "Valor": bill.value,
-                "Categoria": bill.category.name,
+                "Categoria": category.name,
                 "Data": util.formatted_date(bill.date),
             },
         )
 
         return StepResult(tokens_used=tokens, message=message, quote_message=True)
 
+    async def _get_bill_to_register(self, message_body, category_index):
+        tokens, bill_to_register = await self._extract_bill_to_register(
+            message_body, category_index
+        )
+
+        # The LLM may answer with an id that is not one of the tenant's categories
+        category_ids = {category["id"] for category in category_index.categories}
+        if bill_to_register.get("category_id") not in category_ids:
+            category_id = category_index.match(message_body)
+
+            if category_id is None:
+                default = category_index.default() or next(
+                    iter(category_index.categories), None
+                )
+                category_id = default["id"] if default else None
+
+            bill_to_register = {**bill_to_register, "category_id": category_id}
+
+        return tokens, bill_to_register
+
+    async def _extract_bill_to_register(self, message_body, category_index):
+        if all(
+            self.arguments.get(key) is not None
+            for key in ("value", "date", "category_id")
+        ):
+            return 0, self.arguments
+
+        # Only the best candidates go to the LLM instead of every category
+        categories = category_index.shortlist(message_body)
+
+        value = extract.extract_amount(message_body)
+        date = extract.extract_date(message_body)
+
+        if value is None or date is None:
+            return await ai.get_bill_to_register(message_body, categories)
+
+        self.log.info("Extracted bill value and date locally")
+
+        tokens = 0
+
+        if (category_id := category_index.match(message_body)) is not None:
+            self.log.info("Matched bill category locally")
+        elif len(categories) == 1:
+            category_id = categories[0]["id"]
+        else:
+            tokens, category_id = await ai.get_bill_category(message_body, categories)
+
+        bill_to_register = dict(
+            value=value, date=date.isoformat(), category_id=category_id
+        )
+
+        return tokens, bill_to_register
+
 
 class RegisterCategory(TerminalStep):
     intent_description = (
@@ -510,7 +646,13 @@ class RegisterCategory(TerminalStep):
         )
 
         self.session.add(category)
-        self.session.flush()
+        await self.session.flush()
+
+        # Only drop the cache once the category is visible to other messages
+        database.on_commit(
+            self.session,
+            functools.partial(cache.invalidate_categories, self.user.tenant_id),
+        )
 
         message = util.create_whatsapp_aligned_text(
             "Categoria registrada",
@@ -534,7 +676,7 @@ class DeleteBill(TerminalStep):
         )
 
         if message_payload.quoted_message_id is not None:
-            bill_to_delete = Bill.get_by_message_id(
+            bill_to_delete = await Bill.get_by_message_id(
                 self.session, self.user.tenant_id, message_payload.quoted_message_id
             )
 
@@ -544,16 +686,21 @@ class DeleteBill(TerminalStep):
             )
 
             if bill_to_delete is not None:
+                category = await bill_to_delete.awaitable_attrs.category
+
                 message = util.create_whatsapp_aligned_text(
                     "Despesa excluida",
                     {
                         "Valor": bill_to_delete.value,
-                        "Categoria": bill_to_delete.category.name,
+                        "Categoria": category.name,
                         "Data": util.formatted_date(bill_to_delete.date),
                     },
                 )
 
-                self.session.delete(bill_to_delete)
+                await BillDailyRollup.add_bills(
+                    self.session, Bill.id == bill_to_delete.id, sign=-1
+                )
+                await self.session.delete(bill_to_delete)
 
         return StepResult(message=message)
 
@@ -564,33 +711,31 @@ class SumBills(TerminalStep):
         "Ele deve citar o dia ou período, e opcionalmente qual categoria."
         "O usuário não vai citar valores especificamente."
     )
+    intent_arguments = "query"
 
     async def _process(self, message_payload):
         categories = {
-            category.id: category.to_dict()
-            for category in Category.get_all(self.session, self.user.tenant_id).all()
+            category["id"]: category
+            for category in await cache.get_categories(
+                self.session, self.user.tenant_id
+            )
         }
 
-        tokens, query_data = await ai.get_bills_query_data(
-            message_payload.message_body, categories.values()
+        tokens, query_data = await _get_bills_query_data(
+            message_payload.message_body, list(categories.values()), self.arguments
         )
 
         category_name = None
 
-        filters = [Bill.tenant_id == self.user.tenant_id]
-
-        if len(query_data["range"]) == 1:
-            filters.append(Bill.date == query_data["range"][0])
-        else:
-            filters.append(Bill.date.between(*query_data["range"]))
+        params = _period_params(query_data["range"])
 
         if category_id := query_data.get("category_id", None):
-            filters.append(Bill.category_id == category_id)
+            params["category_id"] = category_id
             category_name = categories[category_id]["name"]
 
-        query = select(func.sum(Bill.value)).where(and_(*filters))  # noqa: F821
-
-        sum_value = self.session.execute(query).scalar() or 0
+        sum_value = await BillDailyRollup.get_total(
+            self.session, self.user.tenant_id, **params
+        )
 
         message = "Soma das despesas "
         if len(query_data["range"]) == 1:
@@ -612,11 +757,25 @@ class SumBills(TerminalStep):
 
 class ListCategories(TerminalStep):
     intent_description = "Pedido para listar categorias."
+    intent_patterns = (
+        (
+            r"^((me )?(liste|listar|lista|mostre|mostrar|mostra|ver) )?"
+            r"(as |minhas |as minhas )?categorias$",
+            0.95,
+        ),
+        (
+            r"^(quais|que) (sao )?(as )?(minhas )?categorias"
+            r"( (eu )?tenho| existem| cadastradas| disponiveis)?$",
+            0.95,
+        ),
+    )
 
     async def _process(self, message_payload):
         categories = [
-            {"Nome": category.name, "Descrição": category.description}
-            for category in Category.get_all(self.session, self.user.tenant_id).all()
+            {"Nome": category["name"], "Descrição": category["description"]}
+            for category in await cache.get_categories(
+                self.session, self.user.tenant_id
+            )
         ]
 
         message = util.create_whatsapp_aligned_text("Categorias", categories)
@@ -628,26 +787,32 @@ class RegisterFakeBills(TerminalStep):
     intent_description = (
         "Pedido para registrar despesas falsas para testar as funcionalidades."
     )
+    intent_patterns = (
+        (
+            r"^(cadastre|cadastrar|registre|registrar|gere|gerar|crie|criar) "
+            r"(as |umas |algumas )?despesas (falsas|ficticias)$",
+            0.95,
+        ),
+    )
 
     async def _process(self, message_payload):
-        if self.user.tenant.generated_fake_bills:
+        tenant = await self.user.awaitable_attrs.tenant
+
+        if tenant.generated_fake_bills:
             message = (
                 "Você já gerou despesas falsas. Infelizmente, "
                 "eu não posso fazer esse processo novamente."
             )
-            return StepResult(message=message)
+            return StepResult(message=message, static_message=True)
 
-        categories = Category.get_all(self.session, self.user.tenant_id).all()
+        categories = (await Category.get_all(self.session, self.user.tenant_id)).all()
 
         self.log.info("Registering fake bills")
 
-        total = _register_fake_bills(
-            categories, message_payload.message_id, self.user, self.session
+        total = await _register_fake_bills(
+            categories, message_payload.message_id, tenant, self.session
         )
 
-        self.user.tenant.generated_fake_bills = True
-        self.session.flush()
-
         message = f"Criei um total de {total} despesas falsas!"
 
         return StepResult(message=message)
@@ -655,15 +820,25 @@ class RegisterFakeBills(TerminalStep):
 
 class DeleteFakeBills(TerminalStep):
     intent_description = "Pedido para deletar despesas falsas"
+    intent_patterns = (
+        (
+            r"^(exclua|excluir|apague|apagar|delete|deletar|remova|remover) "
+            r"(as |minhas |as minhas )?despesas (falsas|ficticias)$",
+            0.95,
+        ),
+    )
 
     async def _process(self, message_payload):
         self.log.info("Deleting fake bills")
 
-        count = self.session.execute(
-            delete(Bill).where(
-                and_(Bill.tenant_id == self.user.tenant_id, Bill.fake.is_(True))
-            )
-        ).rowcount
+        fake_bills = and_(Bill.tenant_id == self.user.tenant_id, Bill.fake.is_(True))
+
+        await BillDailyRollup.add_bills(self.session, fake_bills, sign=-1)
+
+        result = await self.session.execute(delete(Bill).where(fake_bills))
+        count = result.rowcount
+
+        await BillDailyRollup.prune(self.session, self.user.tenant_id)
 
         message = f"Removi todas as suas despesas falsas.\nRemovi um total de *{count}* despesas."
 
@@ -677,70 +852,253 @@ class AnalyzeExpenses(TerminalStep):
         "dessas palavras. Ele deve citar também um período. Opcionalmente, "
         "pode citar uma categoria"
     )
+    intent_arguments = "query"
 
     async def _process(self, message_payload):
-        categories = [
-            category.to_dict()
-            for category in Category.get_all(self.session, self.user.tenant_id).all()
-        ]
+        categories = await cache.get_categories(self.session, self.user.tenant_id)
 
         tokens_used = 0
 
-        tokens, query_data = await ai.get_bills_query_data(
-            message_payload.message_body, categories
+        tokens, query_data = await _get_bills_query_data(
+            message_payload.message_body, categories, self.arguments
         )
 
         tokens_used += tokens
 
-        params = dict(session=self.session, tenant_id=self.user.tenant_id)
+        summary = await _summarize_bills(
+            self.session, self.user.tenant_id, query_data, categories
+        )
 
-        if len(query_data["range"]) == 1:
-            params["date"] = query_data["range"][0]
-        else:
-            params["date_range"] = query_data["range"]
+        # Mood rewrites need the whole analysis, so those users are not streamed
+        if (
+            ai.STREAM_ANALYSIS
+            and self.send_message is not None
+            and self.user.billy_mood == BillyMood.NEUTRAL
+        ):
+            tokens_used += await self._stream_analysis(categories, summary)
+            return StepResult(tokens_used=tokens_used)
+
+        tokens, analysis = await ai.get_expenses_analysis(categories, summary)
+
+        tokens_used += tokens
+
+        return StepResult(tokens_used=tokens_used, message=analysis)
+
+    async def _stream_analysis(self, categories, summary):
+        text = ""
+        tokens = 0
+
+        async for chunk, tokens in ai.stream_expenses_analysis(categories, summary):
+            text += chunk
+            parts, text = util.split_text_chunks(text)
+            for part in parts:
+                await self.send_message(part)
+
+        if text.strip():
+            await self.send_message(text.strip())
+
+        return tokens
+
+
+class ExportBills(TerminalStep):
+    intent_description = (
+        "Pedido para exportar ou baixar as despesas em um arquivo "
+        "(planilha, CSV ou JSON). Ele deve citar um período e, "
+        "opcionalmente, uma categoria"
+    )
+    intent_arguments = "query"
+
+    async def _process(self, message_payload):
+        categories = await cache.get_categories(self.session, self.user.tenant_id)
+
+        tokens, query_data = await _get_bills_query_data(
+            message_payload.message_body, categories, self.arguments
+        )
+
+        params = _period_params(query_data["range"])
 
         if category_id := query_data.get("category_id", None):
             params["category_id"] = category_id
 
-        bills = [bill.to_dict() for bill in Bill.get_many(**params).all()]
+        # Files can not be sent over the chat yet, the user gets what the
+        # export would contain and nothing is written on the server
+        totals = await Bill.sum_by_category(self.session, self.user.tenant_id, **params)
 
-        tokens, analysis = await ai.get_expenses_analysis(categories, bills)
+        count = sum(category_count for _, _, category_count in totals)
+        total = sum(category_total for _, category_total, _ in totals)
 
-        tokens_used += tokens
+        period = " a ".join(util.formatted_date(day) for day in query_data["range"])
+
+        message = util.create_whatsapp_aligned_text(
+            "Ainda não consigo enviar arquivos por aqui, "
+            "mas este é o resumo das despesas",
+            {
+                "Período": period,
+                "Despesas": count,
+                "Total": f"R${total:.2f}",
+            },
+        )
+
+        return StepResult(tokens_used=tokens, message=message)
 
-        return StepResult(tokens_used=tokens_used, message=analysis)
 
+class BeginBillReminder(TerminalStep):
+    intent_description = "Pedido para criar lembrete de despesa"
 
-class BeginBillReminder(Step):
-    # intent_description = "Pedido para criar lembrete de despesa"
+    RECURRENCE_LABELS: ClassVar = {
+        ReminderRecurrence.ONCE: "Única",
+        ReminderRecurrence.DAILY: "Diária",
+        ReminderRecurrence.WEEKLY: "Semanal",
+        ReminderRecurrence.MONTHLY: "Mensal",
+    }
 
     async def _process(self, message_payload):
-        return StepResult(message=SOON_MESSAGE)
-        # TODO implement this
+        tokens, reminder_data = await ai.get_bill_reminder(message_payload.message_body)
+
+        if reminder_data["recurrence"] == "unknown":
+            message = (
+                "Não entendi de quanto em quanto tempo você quer ser lembrado. "
+                "Me peça de novo dizendo se o lembrete é único, diário, "
+                "semanal ou mensal."
+            )
+            return StepResult(tokens_used=tokens, message=message)
+
+        try:
+            starts_at = util.parse_date(reminder_data["date"]).replace(
+                hour=REMINDER_HOUR, minute=0, second=0, microsecond=0
+            )
+        except (KeyError, TypeError, ValueError):
+            message = (
+                "Não entendi a partir de quando você quer ser lembrado. "
+                "Me peça de novo dizendo a data do primeiro lembrete."
+            )
+            return StepResult(tokens_used=tokens, message=message)
+
+        reminder = Reminder(
+            tenant_id=self.user.tenant_id,
+            user_id=self.user.id,
+            description=reminder_data["description"],
+            value=reminder_data.get("value"),
+            recurrence=ReminderRecurrence(reminder_data["recurrence"]),
+            starts_at=starts_at,
+            # A first occurrence already past today fires on the next poll
+            next_fire_at=max(starts_at, datetime.now()),
+        )
+
+        self.session.add(reminder)
+        await self.session.flush()
+
+        message = util.create_whatsapp_aligned_text(
+            "Lembrete criado",
+            {
+                "Descrição": reminder.description,
+                "Frequência": self.RECURRENCE_LABELS[reminder.recurrence],
+                "Próximo lembrete": util.formatted_date(reminder.next_fire_at),
+            },
+        )
+
+        return StepResult(tokens_used=tokens, message=message, quote_message=True)
+
+
+class ListReminders(TerminalStep):
+    intent_description = "Pedido para listar ou ver os lembretes de despesa"
+    intent_patterns = (
+        (
+            r"^((me )?(liste|listar|lista|mostre|mostrar|mostra|ver) )?"
+            r"(os |meus |os meus )?lembretes( ativos)?$",
+            0.95,
+        ),
+        (r"^(quais|que) (sao )?(os )?(meus )?lembretes( ativos)?$", 0.95),
+    )
+
+    async def _process(self, message_payload):
+        reminders = await Reminder.get_active(self.session, self.user.id)
+
+        if not reminders:
+            return StepResult(message="Você não tem lembretes ativos.")
+
+        message = util.create_whatsapp_aligned_text(
+            "Lembretes",
+            [
+                {
+                    "Número": reminder.id,
+                    "Descrição": reminder.description,
+                    "Frequência": BeginBillReminder.RECURRENCE_LABELS[
+                        reminder.recurrence
+                    ],
+                    "Próximo lembrete": util.formatted_date(reminder.next_fire_at),
+                }
+                for reminder in reminders
+            ],
+        )
+        message += "\n\nPara cancelar um deles, me diga *cancelar lembrete* e o número."
+
+        return StepResult(message=message)
+
+
+class CancelReminder(TerminalStep):
+    intent_description = "Pedido para cancelar, parar ou excluir um lembrete de despesa"
+    intent_patterns = (
+        (
+            r"^(cancele|cancelar|cancela|exclua|excluir|apague|apagar|remova|"
+            r"remover|desative|desativar) (o )?lembrete( numero)? \d+$",
+            0.95,
+        ),
+    )
+
+    async def _process(self, message_payload):
+        match = re.search(r"\d+", nlp.normalize(message_payload.message_body))
+
+        if match is None:
+            return StepResult(next_step="ListReminders")
+
+        reminder = await Reminder.cancel(self.session, self.user.id, int(match.group()))
+
+        if reminder is None:
+            message = (
+                f"Não encontrei um lembrete ativo com o número {match.group()}. "
+                "Peça para ver seus lembretes para conferir os números."
+            )
+            return StepResult(message=message)
+
+        return StepResult(
+            message=f"Lembrete *{reminder.description}* cancelado.",
+            quote_message=True,
+        )
 
 
 class StopReceivingNotifications(TerminalStep):
     intent_description = (
         "O usuário não quer mais receber notificações a respeito de novas versões"
     )
+    intent_patterns = (
+        (
+            r"^(eu )?(nao quero (mais )?|quero parar de |quero deixar de |"
+            r"parar de |pare de |deixar de )receber (as |mais )?notificac(ao|oes)"
+            r"( do billy)?$",
+            0.9,
+        ),
+        (r"^(desativar|desative|desligar|desligue) (as )?notificacoes$", 0.95),
+    )
 
     async def _process(self, message_payload):
-        user = self.session.execute(
-            select(User).where(User.phone_number == message_payload.sender_number)
-        ).scalar_one_or_none()
+        user = self.user
 
         if not user:
             return StepResult(message="Não encontrei um usuário com seu número")
 
         user.send_notification = False
 
-        self.session.commit()
+        await self.session.commit()
+
+        cache.invalidate_user(user.phone_number)
 
         return StepResult(
             message=(
                 "Não enviarei mais notificações para você. Caso mude de ideia, "
                 "você pode reativar as notificações.\nAté mais!"
-            )
+            ),
+            static_message=True,
         )
 
 
@@ -749,24 +1107,31 @@ class ActivateNotifications(TerminalStep):
         "O usuário quer receber notificações a respeito de novas versões. "
         "Ele pode também somente dizer 'não quero mais receber notificações'."
     )
+    intent_patterns = (
+        (r"^(quero |voltar a |quero voltar a )receber (as )?notificacoes$", 0.95),
+        (r"^(ativar|ative|ligar|ligue|reativar|reative) (as )?notificacoes$", 0.95),
+    )
 
     async def _process(self, message_payload):
-        user = self.session.execute(
-            select(User).where(User.phone_number == message_payload.sender_number)
-        ).scalar_one_or_none()
+        user = self.user
 
         if not user:
             return StepResult(message="Não encontrei um usuário com seu número")
 
         if user.send_notification:
-            return StepResult(message="Você já está recebendo notificações!")
+            return StepResult(
+                message="Você já está recebendo notificações!", static_message=True
+            )
 
         user.send_notification = True
 
-        self.session.commit()
+        await self.session.commit()
+
+        cache.invalidate_user(user.phone_number)
 
         return StepResult(
-            message=("Voltarei a enviar notificações para você.\nAté mais!")
+            message=("Voltarei a enviar notificações para você.\nAté mais!"),
+            static_message=True,
         )
 
 
@@ -776,6 +1141,16 @@ class Usage(TerminalStep):
         "Ele pode perguntar quais são os comandos que ele pode usar, ou até "
         "como você pode ajudá-lo."
     )
+    intent_patterns = (
+        (r"^(ajuda|help|comandos|menu|funcionalidades)$", 0.95),
+        (
+            r"^(quais|que) (sao )?(os |as )?(seus |suas )?"
+            r"(comandos|funcoes|funcionalidades)( (voce )?tem)?$",
+            0.95,
+        ),
+        (r"^o que (voce )?(pode fazer|faz|sabe fazer)$", 0.9),
+        (r"^como (voce )?(pode me ajudar|me ajuda|funciona)$", 0.9),
+    )
 
     async def _process(self, message_payload):
         message = """
@@ -790,23 +1165,25 @@ class Usage(TerminalStep):
         8. Convidar outras pessoas para compartilhar despesas com você - 'gostaria de convidar um amigo para o meu grupo';
         9. Pedir para parar de receber ou voltar a receber notificações a respeito de novas versões;
         """
-        return StepResult(message=message)
+        return StepResult(message=message, static_message=True)
 
 
 class AskUserInfo(TerminalStep):
     intent_description = (
         "Se o usuário estiver querendo saber sobre seu nome ou quantidade de tokens"
     )
+    intent_patterns = (
+        (r"^(qual (e )?)?(o )?meu nome$", 0.95),
+        (
+            r"^(quantos tokens (eu )?(usei|gastei|tenho|ja usei|ja gastei)|"
+            r"qual (e )?(o )?(meu )?(limite|saldo) de tokens)$",
+            0.9,
+        ),
+        (r"^(meus dados|minhas informacoes|meus tokens)$", 0.95),
+    )
 
     async def _process(self, message_payload):
-        tokens_usage = redis_client.get_many(
-            f"user:{message_payload.sender_number}:token_usage:*"
-        )
-
-        tokens_used = 0
-
-        for token_usage in tokens_usage:
-            tokens_used += int(token_usage)
+        tokens_used = await token_budget.get_used(message_payload.sender_number)
 
         if self.user.name is None:
             return StepResult(message="Não encontrei um usuário com seu número")
@@ -821,6 +1198,13 @@ class AskUserInfo(TerminalStep):
 
 class ChangeName(WaitingStep):
     intent_description = "Se o usuário estiver querendo mudar seu nome de usuário."
+    intent_patterns = (
+        (
+            r"^(quero )?(mudar|alterar|trocar|mude|altere|troque) (o )?meu nome"
+            r"( de usuario)?$",
+            0.95,
+        ),
+    )
 
     @property
     def question(self):
@@ -833,16 +1217,16 @@ class ChangeName(WaitingStep):
 
 class UpdateUserName(TerminalStep):
     async def _process(self, message_payload):
-        user = self.session.execute(
-            select(User).where(User.phone_number == message_payload.sender_number)
-        ).scalar_one_or_none()
+        user = self.user
 
         if not user:
             return StepResult(message="Não encontrei um usuário com seu número")
 
         user.name = message_payload.message_body
 
-        self.session.commit()
+        await self.session.commit()
+
+        cache.invalidate_user(user.phone_number)
 
         return StepResult(
             message=f"Nome atualizado com sucesso! Seu novo nome agora é {user.name}"
@@ -851,6 +1235,13 @@ class UpdateUserName(TerminalStep):
 
 class UpdateBillyMood(WaitingStep):
     intent_description = "Se o usuário quiser alterar o humor do agente"
+    intent_patterns = (
+        (
+            r"^(quero )?(mudar|alterar|trocar|mude|altere|troque) (o )?(seu )?humor"
+            r"( do billy| do agente)?$",
+            0.95,
+        ),
+    )
 
     @property
     def question(self):
@@ -866,9 +1257,7 @@ class UpdateBillyMood(WaitingStep):
 
 class ProcessUpdateBillyMood(TerminalStep):
     async def _process(self, message_payload):
-        user = self.session.execute(
-            select(User).where(User.phone_number == message_payload.sender_number)
-        ).scalar_one_or_none()
+        user = self.user
 
         if not user:
             return StepResult(message="Não encontrei um usuário com seu número")
@@ -879,7 +1268,9 @@ class ProcessUpdateBillyMood(TerminalStep):
 
         user.billy_mood = billy_mood
 
-        self.session.commit()
+        await self.session.commit()
+
+        cache.invalidate_user(user.phone_number)
 
         return StepResult(
             tokens_used=tokens_used,
@@ -895,6 +1286,15 @@ class Courtesy(TerminalStep):
         "Se o usuário estiver somente agradecendo, fazendo uma saudação ou "
         "despedida. O usuário pode estar falando de uma forma bastante coloquial"
     )
+    intent_patterns = (
+        (
+            r"^((muito |mt |mto )?(obrigad[oa]|brigad[oa]|obg|valeu|vlw)|oi+|ola|"
+            r"opa|e ai|bom dia|boa tarde|boa noite|tchau|ate mais|ate logo|"
+            r"ate amanha|falou|flw|tmj|blz|beleza|show|top)"
+            r"( billy)?( (obrigad[oa]|valeu|tchau|billy))?$",
+            0.95,
+        ),
+    )
 
     async def _process(self, message_payload):
         tokens_used, message = await ai.get_courtesy_answer(
@@ -913,32 +1313,155 @@ class Unknown(TerminalStep):
             "fazer, é só pedir."
         )
 
-        return StepResult(message=message)
+        return StepResult(message=message, static_message=True)
+
+
+async def _get_bills_query_data(message_body, categories, arguments):
+    tokens, query_data = await _extract_bills_query_data(
+        message_body, categories, arguments
+    )
+
+    # The LLM may answer with an id that is not one of the tenant's categories
+    category_ids = {category["id"] for category in categories}
+    if query_data.get("category_id") not in category_ids:
+        query_data = {
+            key: value for key, value in query_data.items() if key != "category_id"
+        }
+
+    return tokens, query_data
+
+
+async def _extract_bills_query_data(message_body, categories, arguments):
+    if arguments.get("range"):
+        return 0, arguments
+
+    today = datetime.fromisoformat(util.sql_today()).date()
+    date_range = extract.extract_date_range(message_body, today)
+
+    if date_range is not None:
+        query_data = {"range": date_range}
 
+        if category_id := nlp.match_category_name(message_body, categories):
+            query_data["category_id"] = category_id
+            return 0, query_data
 
-def _register_fake_bills(categories, message_id, tenant, session):
-    bills = []
-    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    for i in range(365):
-        for _ in range(random.randint(1, 3)):
-            category = random.choice(categories)
-            value = random.randint(1, 1000)
-            date = today - timedelta(days=i)
-
-            bill = Bill(
-                value=value,
-                date=date,
-                category_id=category.id,
-                tenant_id=tenant.id,
-                message_id=message_id,
-                fake=True,
+        # Anything left besides the period may name a category in other words
+        if not extract.extract_query_terms(message_body):
+            return 0, query_data
+
+    return await ai.get_bills_query_data(message_body, categories)
+
+
+def _period_params(date_range):
+    if len(date_range) == 1:
+        return dict(date=date_range[0])
+
+    return dict(date_range=date_range)
+
+
+def _previous_period(date_range):
+    start = datetime.fromisoformat(str(date_range[0])[:10]).date()
+    end = datetime.fromisoformat(str(date_range[-1])[:10]).date()
+    days = (end - start).days + 1
+
+    previous_end = start - timedelta(days=1)
+    previous_start = previous_end - timedelta(days=days - 1)
+
+    if days == 1:
+        return [previous_end.isoformat()]
+
+    return [previous_start.isoformat(), previous_end.isoformat()]
+
+
+async def _summarize_bills(session, tenant_id, query_data, categories, top=5):
+    """Aggregate the queried bills into a compact digest for the analysis prompt.
+
+    The database does the grouping so the prompt size depends on the number of
+    categories and periods, not on how many bills the user registered.
+    """
+    date_range = query_data["range"]
+    filters = dict(
+        tenant_id=tenant_id,
+        category_id=query_data.get("category_id") or None,
+    )
+    names = {category["id"]: category["name"] for category in categories}
+    period_days = (
+        datetime.fromisoformat(str(date_range[-1])[:10])
+        - datetime.fromisoformat(str(date_range[0])[:10])
+    ).days + 1
+
+    totals = await Bill.sum_by_category(
+        session, **filters, **_period_params(date_range)
+    )
+    previous_totals = {
+        category_id: total
+        for category_id, total, _ in await Bill.sum_by_category(
+            session, **filters, **_period_params(_previous_period(date_range))
+        )
+    }
+
+    series = []
+    if period_days > 7:
+        unit = "week" if period_days <= 92 else "month"
+        series = [
+            dict(inicio=util.formatted_date(start), total=round(total, 2))
+            for start, total in await Bill.sum_by_period(
+                session, unit=unit, **filters, **_period_params(date_range)
             )
+        ]
+
+    top_bills = [
+        dict(
+            valor=bill.value,
+            data=util.formatted_date(bill.date),
+            categoria=names.get(bill.category_id, "Sem categoria"),
+        )
+        for bill in await Bill.get_top(
+            session, limit=top, **filters, **_period_params(date_range)
+        )
+    ]
+
+    by_category = []
+    for category_id, total, count in totals:
+        previous = previous_totals.get(category_id, 0)
+        item = dict(
+            categoria=names.get(category_id, "Sem categoria"),
+            total=round(total, 2),
+            quantidade=count,
+            total_periodo_anterior=round(previous, 2),
+        )
+        if previous:
+            item["variacao_percentual"] = round((total - previous) / previous * 100)
+        by_category.append(item)
+
+    total = sum(item["total"] for item in by_category)
+    previous_total = sum(previous_totals.values())
+
+    return dict(
+        periodo=" a ".join(util.formatted_date(str(d)[:10]) for d in date_range),
+        total=round(total, 2),
+        total_periodo_anterior=round(previous_total, 2),
+        quantidade=sum(item["quantidade"] for item in by_category),
+        por_categoria=by_category,
+        serie=series,
+        maiores_despesas=top_bills,
+    )
+
 
-            bills.append(bill)
+async def _register_fake_bills(categories, message_id, tenant, session):
+    rows = fake_bills.generate_fake_bills(
+        [category.id for category in categories], tenant.id, message_id
+    )
 
     tenant.generated_fake_bills = True
 
-    session.add_all(bills)
-    session.flush()
+    total = await Bill.insert_many(session, rows)
+
+    await BillDailyRollup.add_bills(
+        session,
+        Bill.tenant_id == tenant.id,
+        Bill.message_id == message_id,
+        Bill.fake.is_(True),
+    )
 
-    return len(bills)
+    return total
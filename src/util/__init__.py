@@ -3,11 +3,16 @@ from contextvars import ContextVar
 from datetime import datetime
 import functools
 import json
+import re
 import time
 
 from src.util.log import Logger
 
+CHANGELOG_FILE_PATH = "data/changelog.json"
+SENTENCE_END_PATTERN = re.compile(r"[.!?] ")
+
 log_ctx: ContextVar[Logger] = ContextVar("logger_context")
+tenant_ctx: ContextVar[int | None] = ContextVar("tenant_context", default=None)
 background_tasks = set()
 
 
@@ -23,6 +28,14 @@ def reset_logger(token):
     log_ctx.reset(token)
 
 
+def set_tenant_id(tenant_id):
+    return tenant_ctx.set(tenant_id)
+
+
+def get_tenant_id():
+    return tenant_ctx.get()
+
+
 def formatted_date(date: str | datetime) -> str:
     if isinstance(date, datetime):
         return date.strftime("%d/%m/%Y")
@@ -36,6 +49,12 @@ def sql_today() -> str:
     return datetime.now().strftime("%Y-%m-%d")
 
 
+def parse_date(date: str | datetime) -> datetime:
+    if isinstance(date, datetime):
+        return date
+    return datetime.fromisoformat(str(date))
+
+
 def create_whatsapp_aligned_text(title: str, lines: dict | list[dict]) -> str:
     # TODO improve this by using list instead of strings
     def iterate_dict(d: dict):
@@ -60,6 +79,45 @@ def create_whatsapp_aligned_text(title: str, lines: dict | list[dict]) -> str:
     return text
 
 
+def _split_point(text):
+    # Whole lines first, so numbered list items are never cut in two
+    if (end := text.rfind("\n")) != -1:
+        return end
+
+    end = -1
+    for match in SENTENCE_END_PATTERN.finditer(text):
+        words = text[: match.start()].split()
+
+        # A "1. " is a list item number, not the end of a sentence
+        if words and words[-1].isdigit():
+            continue
+
+        end = match.end() - 1
+
+    return end
+
+
+def split_text_chunks(text, min_size=200):
+    """Split off complete paragraphs, or lines and sentences once long enough.
+
+    Returns the complete chunks and the remaining text.
+    """
+    chunks = []
+
+    while True:
+        end = text.find("\n\n")
+        if end == -1 and len(text) >= min_size:
+            end = _split_point(text)
+
+        if end == -1:
+            return chunks, text
+
+        if chunk := text[:end].strip():
+            chunks.append(chunk)
+
+        text = text[end:].lstrip()
+
+
 def run_in_background(func):
     def wrapped(*args, **kwargs):
         task = asyncio.create_task(func(*args, **kwargs))
@@ -94,21 +152,25 @@ def time_execution(logger=None, message=""):
     return wrapped
 
 
+@functools.cache
+def get_changelog():
+    with open(CHANGELOG_FILE_PATH, "r") as f:
+        return json.load(f)
+
+
+def reload_changelog():
+    get_changelog.cache_clear()
+    return get_changelog()
+
+
 def get_current_version():
-    with open("data/changelog.json", "r") as f:
-        data = json.load(f)
-        return len(data)
+    return len(get_changelog())
 
 
 def get_version_changes(version_index):
-    with open("data/changelog.json", "r") as f:
-        data = json.load(f)
-
-        if version_index == len(data) - 1:
-            return []
+    data = get_changelog()
 
-        full_changelog = []
-        for version_data in data[version_index + 1 :]:
-            full_changelog.append((version_data))
+    if version_index == len(data) - 1:
+        return []
 
-    return full_changelog
+    return list(data[version_index + 1 :])
@@ -0,0 +1,14 @@
+import os
+
+# The modules build their clients at import time, so they only need to parse
+for name, value in (
+    ("DB_HOST", "localhost"),
+    ("DB_PORT", "5432"),
+    ("DB_USER", "billy"),
+    ("DB_PASSWORD", "billy"),
+    ("DB_DATABASE", "billy"),
+    ("REDIS_HOST", "localhost"),
+    ("REDIS_PORT", "6379"),
+    ("AI_PLATFORM_API_KEY", "test"),
+):
+    os.environ.setdefault(name, value)
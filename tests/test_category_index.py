@@ -0,0 +1,71 @@
+import pytest
+from src.lib.category_index import CategoryIndex
+from src.model import Category
+
+CATEGORIES = [
+    dict(id=position, name=name, description=description)
+    for position, (name, description) in enumerate(
+        [
+            *Category.BASIC_CATEGORIES.items(),
+            Category.DEFAULT_CATEGORY.values(),
+        ],
+        start=1,
+    )
+]
+CATEGORY_IDS = {category["name"]: category["id"] for category in CATEGORIES}
+
+
+@pytest.mark.parametrize(
+    "text, name",
+    [
+        ("padaria", "Alimentação"),
+        ("almoço no restaurante", "Alimentação"),
+        ("combustível do carro", "Transporte"),
+        ("conta de energia elétrica", "Contas de Casa"),
+        ("remédios na farmácia", "Saúde"),
+        ("mensalidade da faculdade", "Educação"),
+        ("assinatura do spotify", "Lazer e Entretenimento"),
+    ],
+)
+def test_match(text, name):
+    assert CategoryIndex(CATEGORIES).match(text) == CATEGORY_IDS[name]
+
+
+@pytest.mark.parametrize("text", ["", "xpto", "gastei 30 reais ontem"])
+def test_match_is_unsure_without_indexed_terms(text):
+    assert CategoryIndex(CATEGORIES).match(text) is None
+
+
+def test_match_keeps_basic_descriptions_of_renamed_categories():
+    categories = [
+        dict(id=1, name="Alimentação", description="Comida"),
+        dict(id=2, name="Transporte", description="Carro"),
+    ]
+
+    assert CategoryIndex(categories).match("padaria") == 1
+
+
+def test_shortlist_adds_the_default_category():
+    shortlist = CategoryIndex(CATEGORIES).shortlist("farmácia e padaria", size=2)
+
+    names = [category["name"] for category in shortlist]
+    assert sorted(names[:2]) == ["Alimentação", "Saúde"]
+    assert names[2:] == ["Diversos"]
+
+
+def test_shortlist_does_not_repeat_the_default_category():
+    shortlist = CategoryIndex(CATEGORIES).shortlist("gastos diversos")
+
+    assert [category["name"] for category in shortlist].count("Diversos") == 1
+
+
+def test_shortlist_without_indexed_terms_returns_every_category():
+    assert CategoryIndex(CATEGORIES).shortlist("xpto") == CATEGORIES
+
+
+def test_shortlist_without_a_default_category():
+    categories = CATEGORIES[:-1]
+
+    shortlist = CategoryIndex(categories).shortlist("padaria", size=1)
+
+    assert shortlist == [categories[0]]
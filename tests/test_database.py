@@ -0,0 +1,45 @@
+import asyncio
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+
+import pytest
+from src import database
+
+
+def _session(monkeypatch, calls):
+    session = MagicMock(info={})
+    session.commit = AsyncMock(side_effect=lambda: calls.append("commit"))
+    session.rollback = AsyncMock(side_effect=lambda: calls.append("rollback"))
+    session.close = AsyncMock()
+    monkeypatch.setattr(database, "AsyncSessionLocal", lambda: session)
+
+    return session
+
+
+def test_on_commit_runs_after_the_commit(monkeypatch):
+    calls = []
+    _session(monkeypatch, calls)
+
+    async def run():
+        async with database.db_session_manager() as session:
+            database.on_commit(session, lambda: calls.append("callback"))
+            calls.append("work")
+
+    asyncio.run(run())
+
+    assert calls == ["work", "commit", "callback"]
+
+
+def test_on_commit_is_skipped_on_rollback(monkeypatch):
+    calls = []
+    _session(monkeypatch, calls)
+
+    async def run():
+        async with database.db_session_manager() as session:
+            database.on_commit(session, lambda: calls.append("callback"))
+            raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run())
+
+    assert calls == ["rollback"]
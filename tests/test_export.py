@@ -0,0 +1,62 @@
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from src import database
+from src import util
+from src.model import Bill
+from src.service import cache
+from src.service import exporter
+from src.service import step
+
+
+def test_cleanup_exports_deletes_only_old_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(exporter, "EXPORT_DIR", str(tmp_path))
+
+    old = tmp_path / "1-old.csv"
+    new = tmp_path / "1-new.csv"
+    old.write_text("date,value\n")
+    new.write_text("date,value\n")
+    two_days_ago = time.time() - 2 * 86400
+    os.utime(old, (two_days_ago, two_days_ago))
+
+    assert exporter.cleanup_exports(max_age=86400) == 1
+    assert sorted(os.listdir(tmp_path)) == ["1-new.csv"]
+
+
+def test_cleanup_exports_without_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(exporter, "EXPORT_DIR", str(tmp_path / "missing"))
+
+    assert exporter.cleanup_exports() == 0
+
+
+def test_export_step_only_summarizes(tmp_path, monkeypatch):
+    monkeypatch.setattr(exporter, "EXPORT_DIR", str(tmp_path))
+    monkeypatch.setattr(
+        cache,
+        "get_categories",
+        AsyncMock(return_value=[dict(id=1, name="Mercado", description=None)]),
+    )
+    monkeypatch.setattr(
+        Bill,
+        "sum_by_category",
+        AsyncMock(return_value=[(1, 120.5, 3), (None, 10.0, 1)]),
+    )
+    database.db_session_ctx.set(None)
+    util.set_logger("test")
+
+    user = SimpleNamespace(tenant_id=1, billy_mood=step.BillyMood.NEUTRAL)
+    export = step.ExportBills(
+        user, {}, arguments=dict(range=["2026-03-01", "2026-03-31"])
+    )
+
+    result = asyncio.run(
+        export.process(SimpleNamespace(message_body="exportar março em csv"))
+    )
+
+    assert "01/03/2026 a 31/03/2026" in result.message
+    assert "```4```" in result.message
+    assert "R$130.50" in result.message
+    assert os.listdir(tmp_path) == []
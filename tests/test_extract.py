@@ -0,0 +1,93 @@
+from datetime import date
+
+import pytest
+from src.lib import extract
+
+# A Sunday
+TODAY = date(2026, 10, 18)
+
+
+@pytest.mark.parametrize(
+    "text, amount",
+    [
+        ("gastei 50 reais no mercado", 50.0),
+        ("gastei R$ 12,50 de uber", 12.5),
+        ("paguei r$1.500 de aluguel", 1500.0),
+        ("gastei 10,5 reais", 10.5),
+        ("almoço 32,90", 32.9),
+        ("gastei 45 no dia 15", 45.0),
+        ("gastei 45 em 10/03", 45.0),
+        # Comma thousands separators are left for the LLM
+        ("gastei 1,234.56 reais hoje", None),
+        ("gastei 1,500 reais hoje", None),
+        ("gastei R$ 1,500 hoje", None),
+        ("gastei R$ 10,505 hoje", None),
+        ("gastei 1.234,56 reais", None),
+        # More than one amount, or none
+        ("gastei 10 reais e 20 reais", None),
+        ("gastei no mercado", None),
+        ("gastei 0 reais", None),
+    ],
+)
+def test_extract_amount(text, amount):
+    assert extract.extract_amount(text) == amount
+
+
+@pytest.mark.parametrize(
+    "text, day",
+    [
+        ("gastei 10 reais hoje", date(2026, 10, 18)),
+        ("gastei 10 reais ontem", date(2026, 10, 17)),
+        ("anteontem gastei 10", date(2026, 10, 16)),
+        ("gastei na segunda", date(2026, 10, 12)),
+        ("sexta feira gastei 20", date(2026, 10, 16)),
+        ("gastei no sábado", date(2026, 10, 17)),
+        ("gastei dia 15", date(2026, 10, 15)),
+        ("gastei dia 20", date(2026, 9, 20)),
+        ("gastei em 10/03", date(2026, 3, 10)),
+        ("gastei em 25/12", date(2025, 12, 25)),
+        ("gastei em 10/03/24", date(2024, 3, 10)),
+        # Ordinals are not weekdays
+        ("paguei a segunda parcela de 200 reais", None),
+        ("gastei hoje e ontem", None),
+        ("gastei em 31/02", None),
+        ("gastei 10 reais", None),
+    ],
+)
+def test_extract_date(text, day):
+    assert extract.extract_date(text, TODAY) == day
+
+
+@pytest.mark.parametrize(
+    "text, date_range",
+    [
+        ("quanto gastei hoje", ["2026-10-18"]),
+        ("quanto gastei esse mês", ["2026-10-01", "2026-10-18"]),
+        ("quanto gastei na semana passada", ["2026-10-05", "2026-10-11"]),
+        ("quanto gastei no mês passado", ["2026-09-01", "2026-09-30"]),
+        ("quanto gastei em março", ["2026-03-01", "2026-03-31"]),
+        ("quanto gastei em novembro", ["2025-11-01", "2025-11-30"]),
+        ("gastos de março de 2024", ["2024-03-01", "2024-03-31"]),
+        ("quanto gastei nos últimos 7 dias", ["2026-10-12", "2026-10-18"]),
+        ("gastos entre 01/09 e 15/09", ["2026-09-01", "2026-09-15"]),
+        ("gastos entre 15/09 e 01/09", None),
+        ("quanto gastei em março e abril", None),
+        ("quanto gastei em março ontem", None),
+        ("quanto gastei com mercado", None),
+    ],
+)
+def test_extract_date_range(text, date_range):
+    assert extract.extract_date_range(text, TODAY) == date_range
+
+
+@pytest.mark.parametrize(
+    "text, terms",
+    [
+        ("quanto gastei esse mês", []),
+        ("quanto eu gastei com mercado em março", ["mercado"]),
+        ("quanto gastei na sexta com uber", ["uber"]),
+        ("quanto gastei com a segunda parcela", ["segunda", "parcela"]),
+    ],
+)
+def test_extract_query_terms(text, terms):
+    assert extract.extract_query_terms(text) == terms
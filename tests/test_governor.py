@@ -0,0 +1,149 @@
+import asyncio
+
+import httpx
+import pytest
+from src.lib.governor import LLMGovernor
+
+
+def test_deadline_covers_all_tries():
+    governor = LLMGovernor(timeout=0.2, retries=10)
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(1)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        with pytest.raises(asyncio.TimeoutError):
+            await governor.run(slow)
+
+        return loop.time() - start
+
+    assert asyncio.run(main()) < 0.5
+    assert len(calls) == 1
+
+
+def test_cancelled_trial_reopens_probe():
+    governor = LLMGovernor(timeout=5)
+    governor.circuit_breaker.opened_at = 0
+    governor.circuit_breaker.recovery_time = 0
+
+    async def main():
+        task = asyncio.ensure_future(governor.run(lambda: asyncio.sleep(1)))
+        await asyncio.sleep(0.05)
+        assert governor.circuit_breaker.trial_in_flight
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+
+    assert not governor.circuit_breaker.trial_in_flight
+
+
+def test_tenant_semaphores_are_dropped_when_idle():
+    governor = LLMGovernor()
+
+    async def request():
+        return "ok"
+
+    async def main():
+        return await asyncio.gather(
+            *(governor.run(request, tenant_id=tenant_id) for tenant_id in range(100))
+        )
+
+    assert asyncio.run(main()) == ["ok"] * 100
+    assert governor.tenant_semaphores == {}
+
+
+async def _chunks(*chunks, error=None):
+    for chunk in chunks:
+        yield chunk
+
+    if error is not None:
+        raise error
+
+
+def test_stream_records_the_outcome_after_the_last_chunk():
+    governor = LLMGovernor(timeout=5)
+    circuit_breaker = governor.circuit_breaker
+    circuit_breaker.failure_threshold = 1
+
+    async def request():
+        return _chunks("a", "b", error=httpx.ReadError("reset"))
+
+    async def main():
+        received = []
+        with pytest.raises(httpx.ReadError):
+            async for chunk in governor.stream(request):
+                received.append(chunk)
+                assert not circuit_breaker.is_open
+
+        return received
+
+    assert asyncio.run(main()) == ["a", "b"]
+    assert circuit_breaker.is_open
+    assert governor.tenant_semaphores == {}
+
+
+def test_stream_success_closes_the_circuit():
+    governor = LLMGovernor(timeout=5)
+    governor.circuit_breaker.failures = 2
+
+    async def request():
+        return _chunks("a", "b")
+
+    async def main():
+        return [chunk async for chunk in governor.stream(request)]
+
+    assert asyncio.run(main()) == ["a", "b"]
+    assert governor.circuit_breaker.failures == 0
+
+
+def test_a_call_that_gives_up_is_one_failure():
+    governor = LLMGovernor(timeout=5, retries=3)
+
+    async def request():
+        raise httpx.ConnectError("refused")
+
+    async def main():
+        with pytest.raises(httpx.ConnectError):
+            await governor.run(request)
+
+    asyncio.run(main())
+
+    assert governor.circuit_breaker.failures == 1
+
+
+def test_calls_without_tenant_only_share_the_global_limit():
+    governor = LLMGovernor(max_tenant_concurrency=1)
+    running = []
+
+    async def request():
+        running.append(1)
+        await asyncio.sleep(0.01)
+        return len(running)
+
+    async def main():
+        return await asyncio.gather(*(governor.run(request) for _ in range(5)))
+
+    assert max(asyncio.run(main())) == 5
+    assert governor.tenant_semaphores == {}
+
+
+def test_hedged_duplicate_takes_a_global_slot():
+    governor = LLMGovernor(max_concurrency=2, hedge=True)
+    governor.latencies.extend([0.01] * 100)
+    calls = []
+
+    async def request():
+        calls.append(governor.semaphore._value)
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    assert asyncio.run(governor.run(request)) == "ok"
+    # The first request runs under run's slot, the duplicate under its own
+    assert calls == [1, 0]
@@ -0,0 +1,88 @@
+import asyncio
+from datetime import date
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+
+import pytest
+from src.service import importer
+
+
+def _transaction(day, value, description, reference=None):
+    return dict(
+        date=date(2024, 3, day),
+        value=value,
+        description=description,
+        reference=reference,
+    )
+
+
+STATEMENT = [
+    _transaction(1, -12.5, "PADARIA"),
+    _transaction(1, -30.0, "UBER"),
+    _transaction(1, -12.5, "PADARIA"),
+    _transaction(2, -12.5, "PADARIA"),
+    _transaction(2, -99.9, "MERCADO", reference="abc"),
+]
+
+
+def _ids(transactions):
+    return [
+        transaction["message_id"]
+        for transaction in importer._message_ids(1, transactions)
+    ]
+
+
+def test_message_ids_do_not_depend_on_the_order_within_a_day():
+    reordered = [STATEMENT[1], STATEMENT[2], STATEMENT[0], *STATEMENT[3:]]
+
+    ids = _ids(STATEMENT)
+
+    assert len(set(ids)) == len(STATEMENT)
+    assert sorted(ids) == sorted(_ids(reordered))
+
+
+def test_message_ids_do_not_depend_on_the_date_order():
+    descending = [*STATEMENT[3:], *STATEMENT[:3]]
+
+    assert sorted(_ids(STATEMENT)) == sorted(_ids(descending))
+
+
+def test_message_ids_depend_on_the_tenant():
+    other = [
+        transaction["message_id"] for transaction in importer._message_ids(2, STATEMENT)
+    ]
+
+    assert not set(other) & set(_ids(STATEMENT))
+
+
+def test_message_ids_reject_days_listed_apart():
+    with pytest.raises(ValueError):
+        _ids([STATEMENT[0], STATEMENT[3], STATEMENT[1]])
+
+
+def test_import_chunk_updates_the_rollup_in_batches(monkeypatch):
+    bill_ids = list(range(25))
+    add_bills = AsyncMock()
+    monkeypatch.setattr(importer, "IMPORT_ROLLUP_BATCH_SIZE", 10)
+    monkeypatch.setattr(importer.Bill, "import_many", AsyncMock(return_value=bill_ids))
+    monkeypatch.setattr(importer.BillDailyRollup, "add_bills", add_bills)
+
+    session = MagicMock(commit=AsyncMock())
+    session_factory = MagicMock()
+    session_factory.return_value.__aenter__ = AsyncMock(return_value=session)
+    session_factory.return_value.__aexit__ = AsyncMock(return_value=False)
+
+    statement_importer = importer.StatementImporter(
+        session_factory, 1, use_ai=False, log=MagicMock()
+    )
+    statement_importer.category_cache.update(PADARIA=4)
+    statement_importer.default_category_id = 4
+    transactions = list(importer._message_ids(1, STATEMENT[:1]))
+
+    assert asyncio.run(statement_importer._import_chunk(transactions)) == 25
+    assert [len(call.args[1].right.value) for call in add_bills.await_args_list] == [
+        10,
+        10,
+        5,
+    ]
+    session.commit.assert_awaited_once()
@@ -0,0 +1,32 @@
+import pytest
+from src.lib import nlp
+from src.service.step import Step
+
+INTENT_RULES = {
+    name: step.intent_rules for name, step in Step.registry.items() if step.intent_rules
+}
+
+
+@pytest.mark.parametrize(
+    "text, intent",
+    [
+        ("quais são as minhas categorias?", "ListCategories"),
+        ("quais categorias eu tenho", "ListCategories"),
+        ("listar categorias", "ListCategories"),
+        ("quais são os seus comandos?", "Usage"),
+        ("quantos tokens eu usei?", "AskUserInfo"),
+        ("qual é o meu saldo de tokens", "AskUserInfo"),
+        ("não quero mais receber notificações", "StopReceivingNotifications"),
+        ("quero parar de receber notificações", "StopReceivingNotifications"),
+        ("desativar notificações", "StopReceivingNotifications"),
+        # Questions that only start like a fast-path intent go to the LLM
+        ("quais categorias eu gastei mais?", None),
+        ("quais as minhas categorias de gasto mais caras", None),
+        ("quantos tokens gastei em março?", None),
+        ("quais comandos de exportação existem", None),
+        ("eu não quero parar de receber notificações", None),
+        ("não quero deixar de receber notificações", None),
+    ],
+)
+def test_classify_intent(text, intent):
+    assert nlp.classify_intent(text, INTENT_RULES) == intent
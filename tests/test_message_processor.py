@@ -0,0 +1,65 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+
+import pytest
+from src.service import MessageProcessor
+
+
+@pytest.mark.parametrize(
+    "body",
+    [b"not json", b"[1, 2]", b'{"sender_number": "5511999999999"}'],
+)
+def test_malformed_messages_are_not_requeued(body):
+    processor = MessageProcessor(session_factory=None)
+    message = MagicMock(body=body, reject=AsyncMock())
+
+    asyncio.run(processor._process_message(message))
+
+    message.reject.assert_awaited_once_with(requeue=False)
+    message.process.assert_not_called()
+
+
+def test_waiting_for_a_user_lock_does_not_take_a_slot(monkeypatch):
+    processor = MessageProcessor(session_factory=None, max_concurrent_messages=1)
+    locked = asyncio.Event()
+    handled = []
+
+    async def bootstrap(phone_number):
+        if phone_number == "1":
+            # Locked by another node for a while
+            await locked.wait()
+        return {}, 0
+
+    async def handle(message_payload, conversation):
+        handled.append(message_payload.sender_number)
+        locked.set()
+
+    monkeypatch.setattr(processor, "_bootstrap_conversation", bootstrap)
+    monkeypatch.setattr(processor, "_handle_message", handle)
+
+    def message(sender_number):
+        body = json.dumps(
+            dict(
+                transaction_id="t",
+                message_type="text",
+                message_body="oi",
+                sender_number=sender_number,
+                message_id=f"m{sender_number}",
+            )
+        )
+        return MagicMock(body=body.encode(), process=MagicMock())
+
+    async def main():
+        await asyncio.wait_for(
+            asyncio.gather(
+                processor._process_message(message("1")),
+                processor._process_message(message("2")),
+            ),
+            timeout=1,
+        )
+
+    asyncio.run(main())
+
+    assert handled == ["2", "1"]
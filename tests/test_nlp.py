@@ -0,0 +1,39 @@
+import pytest
+from src.lib import nlp
+
+
+@pytest.mark.parametrize(
+    "text, answer",
+    [
+        ("Sim", True),
+        ("siiim!", True),
+        ("Pode ser", True),
+        ("ah, claro", True),
+        ("👍", True),
+        ("ok 👍", True),
+        ("Não", False),
+        ("nãooo", False),
+        ("Não, obrigado", False),
+        ("hmm melhor não", False),
+        ("👎", False),
+        ("não ❌", False),
+    ],
+)
+def test_classify_yes_or_no(text, answer):
+    assert nlp.classify_yes_or_no(text) is answer
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "talvez",
+        "sim, mas só o de ontem",
+        "não sei",
+        "👍👎",
+        "sim 👎",
+        "não 👍",
+    ],
+)
+def test_classify_yes_or_no_is_unsure(text):
+    assert nlp.classify_yes_or_no(text) is None
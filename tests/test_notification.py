@@ -0,0 +1,34 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+from src.service.notification import VersionNotifier
+
+
+def test_retries_until_the_lock_is_free():
+    notifier = VersionNotifier(session_factory=None, retry_interval=0.01)
+    notifier.redis_client = AsyncMock()
+    notifier.redis_client.acquire_lock.side_effect = [False, False, True]
+    notifier._notify_users = AsyncMock(return_value=(True, 3))
+
+    asyncio.run(notifier.run())
+
+    assert notifier.redis_client.acquire_lock.await_count == 3
+    token = notifier.redis_client.acquire_lock.await_args.kwargs["token"]
+    notifier._notify_users.assert_awaited_once_with(token)
+    notifier.redis_client.release_lock.assert_awaited_once_with(
+        "version_notification:lock", token=token
+    )
+
+
+def test_stops_retrying_on_shutdown():
+    notifier = VersionNotifier(session_factory=None, retry_interval=60)
+    notifier.redis_client = AsyncMock()
+    notifier.redis_client.acquire_lock.return_value = False
+
+    async def main():
+        task = asyncio.ensure_future(notifier.run())
+        await asyncio.sleep(0.01)
+        await notifier.close()
+        await asyncio.wait_for(task, timeout=1)
+
+    asyncio.run(main())
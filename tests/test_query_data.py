@@ -0,0 +1,44 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+from src.service import step
+
+CATEGORIES = [
+    dict(id=1, name="Mercado", description=None),
+    dict(id=2, name="Transporte", description=None),
+]
+
+
+def test_unknown_category_from_the_intent_arguments_is_dropped():
+    arguments = dict(range=["2026-03-01", "2026-03-31"], category_id=42)
+
+    tokens, query_data = asyncio.run(
+        step._get_bills_query_data("quanto gastei em março", CATEGORIES, arguments)
+    )
+
+    assert query_data == dict(range=["2026-03-01", "2026-03-31"])
+    assert arguments["category_id"] == 42
+
+
+def test_unknown_category_from_the_llm_is_dropped(monkeypatch):
+    monkeypatch.setattr(
+        step.ai,
+        "get_bills_query_data",
+        AsyncMock(return_value=(12, dict(range=["2026-03-01"], category_id=7))),
+    )
+
+    tokens, query_data = asyncio.run(
+        step._get_bills_query_data("quanto gastei com aquilo", CATEGORIES, {})
+    )
+
+    assert (tokens, query_data) == (12, dict(range=["2026-03-01"]))
+
+
+def test_known_category_is_kept():
+    arguments = dict(range=["2026-03-01"], category_id=2)
+
+    _, query_data = asyncio.run(
+        step._get_bills_query_data("quanto gastei", CATEGORIES, arguments)
+    )
+
+    assert query_data == arguments
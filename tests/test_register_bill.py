@@ -0,0 +1,68 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from src import database
+from src import util
+from src.lib.category_index import CategoryIndex
+from src.service import step
+
+CATEGORIES = [
+    dict(id=1, name="Transporte", description="Uber, ônibus e combustível"),
+    dict(id=2, name="Diversos", description="Gastos que não se encaixam"),
+    dict(id=3, name="Alimentação", description="Mercado e restaurantes"),
+]
+
+
+def _register_bill(arguments=None):
+    database.db_session_ctx.set(None)
+    util.set_logger("test")
+
+    user = SimpleNamespace(tenant_id=1, billy_mood=step.BillyMood.NEUTRAL)
+    return step.RegisterBill(user, {}, arguments=arguments)
+
+
+@pytest.mark.parametrize(
+    "message, category_id",
+    [
+        ("gastei 30 reais de transporte, uber", 1),
+        ("gastei 30 reais com aquilo ontem", 2),
+    ],
+)
+def test_unknown_fused_category_falls_back(message, category_id):
+    register_bill = _register_bill(dict(value=30.0, date="2026-10-17", category_id=999))
+
+    _, bill = asyncio.run(
+        register_bill._get_bill_to_register(message, CategoryIndex(CATEGORIES))
+    )
+
+    assert bill == dict(value=30.0, date="2026-10-17", category_id=category_id)
+
+
+def test_unknown_category_from_the_llm_falls_back(monkeypatch):
+    monkeypatch.setattr(
+        step.ai,
+        "get_bill_to_register",
+        AsyncMock(return_value=(9, dict(value=30.0, date="2026-10-17", category_id=7))),
+    )
+
+    tokens, bill = asyncio.run(
+        _register_bill()._get_bill_to_register(
+            "uns trocados de transporte, uber", CategoryIndex(CATEGORIES)
+        )
+    )
+
+    assert (tokens, bill["category_id"]) == (9, 1)
+
+
+def test_known_category_is_kept():
+    arguments = dict(value=30.0, date="2026-10-17", category_id=3)
+
+    _, bill = asyncio.run(
+        _register_bill(arguments)._get_bill_to_register(
+            "gastei 30 reais de uber", CategoryIndex(CATEGORIES)
+        )
+    )
+
+    assert bill == arguments
@@ -0,0 +1,28 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from src.service import reminder as reminder_module
+from src.service.reminder import ReminderScheduler
+
+
+def test_failed_publish_clears_the_fired_mark(monkeypatch):
+    scheduler = ReminderScheduler(session_factory=None)
+    scheduler.redis_client = AsyncMock()
+    scheduler.redis_client.acquire_lock.return_value = True
+    monkeypatch.setattr(
+        reminder_module.amqp_client,
+        "publish",
+        AsyncMock(side_effect=ConnectionError("closed")),
+    )
+
+    reminder = SimpleNamespace(
+        id=7, description="Aluguel", value=1500.0, next_fire_at=datetime(2026, 3, 5, 9)
+    )
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(scheduler._publish(reminder, "5511999999999"))
+
+    scheduler.redis_client.delete.assert_awaited_once_with("reminder:7:202603050900")
@@ -0,0 +1,104 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from src import database
+from src import util
+from src.lib import nlp
+from src.model import Reminder
+from src.model import ReminderRecurrence
+from src.service import step
+
+INTENT_RULES = {
+    name: step_class.intent_rules
+    for name, step_class in step.Step.registry.items()
+    if step_class.intent_rules
+}
+
+
+def _step(step_class):
+    database.db_session_ctx.set(None)
+    util.set_logger("test")
+
+    user = SimpleNamespace(id=3, tenant_id=1, billy_mood=step.BillyMood.NEUTRAL)
+    return step_class(user, {})
+
+
+@pytest.mark.parametrize(
+    "text, intent",
+    [
+        ("quais são meus lembretes?", "ListReminders"),
+        ("ver lembretes", "ListReminders"),
+        ("cancelar lembrete 12", "CancelReminder"),
+        ("apague o lembrete número 3", "CancelReminder"),
+        ("cancelar lembrete do aluguel", None),
+    ],
+)
+def test_reminder_intents(text, intent):
+    assert nlp.classify_intent(text, INTENT_RULES) == intent
+
+
+def test_cancel_reminder_of_the_user(monkeypatch):
+    cancel = AsyncMock(return_value=SimpleNamespace(description="pagar o aluguel"))
+    monkeypatch.setattr(Reminder, "cancel", cancel)
+
+    result = asyncio.run(
+        _step(step.CancelReminder).process(
+            SimpleNamespace(message_body="cancelar lembrete 12")
+        )
+    )
+
+    cancel.assert_awaited_once_with(None, 3, 12)
+    assert "pagar o aluguel" in result.message
+
+
+def test_cancel_reminder_without_number_lists_them():
+    result = asyncio.run(
+        _step(step.CancelReminder).process(
+            SimpleNamespace(message_body="quero cancelar um lembrete")
+        )
+    )
+
+    assert result.next_step == "ListReminders"
+
+
+def test_list_reminders(monkeypatch):
+    reminder = SimpleNamespace(
+        id=12,
+        description="pagar o aluguel",
+        recurrence=ReminderRecurrence.MONTHLY,
+        next_fire_at=datetime(2026, 11, 5, 9),
+    )
+    monkeypatch.setattr(Reminder, "get_active", AsyncMock(return_value=[reminder]))
+
+    result = asyncio.run(
+        _step(step.ListReminders).process(SimpleNamespace(message_body="lembretes"))
+    )
+
+    assert "```12```" in result.message
+    assert "```Mensal```" in result.message
+    assert "05/11/2026" in result.message
+
+
+def test_malformed_reminder_date_asks_again(monkeypatch):
+    monkeypatch.setattr(
+        step.ai,
+        "get_bill_reminder",
+        AsyncMock(
+            return_value=(
+                5,
+                dict(recurrence="monthly", description="aluguel", date="dia 5"),
+            )
+        ),
+    )
+
+    result = asyncio.run(
+        _step(step.BeginBillReminder).process(
+            SimpleNamespace(message_body="me lembre do aluguel todo dia 5")
+        )
+    )
+
+    assert result.tokens_used == 5
+    assert "data do primeiro lembrete" in result.message
@@ -0,0 +1,27 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+from src.lib.response_cache import ResponseCache
+
+
+def test_key_keeps_punctuation():
+    key = ResponseCache.key
+
+    assert key("p", None, "ctx", "Gastei 10,50") != key("p", None, "ctx", "gastei 1050")
+    assert key("p", None, "ctx", "Gastei  10,50 ") == key(
+        "p", None, "ctx", "gastei 10,50"
+    )
+
+
+def test_local_hits_return_a_copy():
+    cache = ResponseCache(AsyncMock(), enabled=True)
+
+    async def main():
+        await cache.set("key", {"bills": [{"value": 10}]})
+
+        first = await cache.get("key")
+        first["bills"].append({"value": 20})
+
+        return await cache.get("key")
+
+    assert asyncio.run(main()) == {"bills": [{"value": 10}]}
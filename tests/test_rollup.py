@@ -0,0 +1,60 @@
+import asyncio
+from unittest.mock import AsyncMock
+from unittest.mock import MagicMock
+
+from sqlalchemy.dialects import postgresql
+from src.model import Bill
+from src.model import BillDailyRollup
+
+
+def _executed_sql(method, *args, **kwargs):
+    session = MagicMock(execute=AsyncMock())
+
+    asyncio.run(method(session, *args, **kwargs))
+
+    return [
+        " ".join(
+            str(
+                call.args[0].compile(
+                    dialect=postgresql.dialect(),
+                    compile_kwargs=dict(literal_binds=True),
+                )
+            ).split()
+        )
+        for call in session.execute.await_args_list
+    ]
+
+
+def test_add_bills_upserts_the_grouped_totals():
+    (sql,) = _executed_sql(BillDailyRollup.add_bills, Bill.tenant_id == 3)
+
+    assert sql.startswith(
+        "INSERT INTO bill_daily_rollup (tenant_id, day, category_id, total, count) "
+        "SELECT bill.tenant_id, CAST(bill.date AS DATE)"
+    )
+    assert "1 * sum(bill.value)" in sql
+    assert "1 * count(bill.id)" in sql
+    assert (
+        "FROM bill WHERE bill.tenant_id = 3 GROUP BY bill.tenant_id, "
+        "CAST(bill.date AS DATE), coalesce(bill.category_id, 0) "
+    ) in sql
+    assert sql.endswith(
+        "ON CONFLICT (tenant_id, day, category_id) DO UPDATE SET "
+        "total = (bill_daily_rollup.total + excluded.total), "
+        "count = (bill_daily_rollup.count + excluded.count)"
+    )
+
+
+def test_add_bills_subtracts_with_a_negative_sign():
+    (sql,) = _executed_sql(BillDailyRollup.add_bills, Bill.id.in_([1, 2]), sign=-1)
+
+    assert "-1 * sum(bill.value)" in sql
+    assert "-1 * count(bill.id)" in sql
+    assert "WHERE bill.id IN (1, 2)" in sql
+
+
+def test_prune_deletes_empty_days_of_the_tenant():
+    assert _executed_sql(BillDailyRollup.prune, 3) == [
+        "DELETE FROM bill_daily_rollup WHERE bill_daily_rollup.tenant_id = 3 "
+        "AND bill_daily_rollup.count <= 0"
+    ]
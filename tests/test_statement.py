@@ -0,0 +1,40 @@
+import io
+
+import pytest
+from src.lib import statement
+
+
+@pytest.mark.parametrize(
+    "text, value",
+    [
+        ("1.234,56", 1234.56),
+        ("1,234.56", 1234.56),
+        ("R$ -1.234,56", -1234.56),
+        ("-1,234,567.89", -1234567.89),
+        ("12,34", 12.34),
+        ("12.34", 12.34),
+        ("1.234", 1234.0),
+        ("50,00-", -50.0),
+    ],
+)
+def test_parse_value(text, value):
+    assert statement.parse_value(text) == value
+
+
+class Unseekable(io.StringIO):
+    def seekable(self):
+        return False
+
+    def seek(self, *args):
+        raise io.UnsupportedOperation("seek")
+
+
+def test_read_csv_without_seeking():
+    rows = "".join(f"0{day}/03/2026;Mercado {day};-{day}0,50\n" for day in range(1, 10))
+    file = Unseekable("Data;Descrição;Valor\n" + rows * 100)
+
+    transactions = list(statement.read_csv(file))
+
+    assert len(transactions) == 900
+    assert transactions[0]["description"] == "Mercado 1"
+    assert transactions[-1]["value"] == -90.5
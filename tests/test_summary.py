@@ -0,0 +1,50 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+from src.model import Bill
+from src.service import step
+
+CATEGORIES = [
+    dict(id=1, name="Mercado", description=None),
+    dict(id=2, name="Transporte", description=None),
+]
+
+
+async def _sum_by_category(session, tenant_id, date=None, date_range=None, **kwargs):
+    if date_range == ["2026-03-01", "2026-03-31"]:
+        return [(1, 300.0, 3), (2, 50.0, 1), (99, 10.0, 1)]
+
+    return [(1, 200.0, 2)]
+
+
+async def _sum_by_period(session, tenant_id, unit, **kwargs):
+    return [(datetime(2026, 3, 2), 200.0), (datetime(2026, 3, 9), 160.0)]
+
+
+async def _get_top(session, tenant_id, limit, **kwargs):
+    return [SimpleNamespace(value=250.0, date=datetime(2026, 3, 5), category_id=1)]
+
+
+def test_summarize_bills_with_cached_categories(monkeypatch):
+    monkeypatch.setattr(Bill, "sum_by_category", _sum_by_category)
+    monkeypatch.setattr(Bill, "sum_by_period", _sum_by_period)
+    monkeypatch.setattr(Bill, "get_top", _get_top)
+
+    summary = asyncio.run(
+        step._summarize_bills(
+            None, 1, dict(range=["2026-03-01", "2026-03-31"]), CATEGORIES
+        )
+    )
+
+    assert summary["total"] == 360.0
+    assert summary["total_periodo_anterior"] == 200.0
+    assert summary["quantidade"] == 5
+    assert [item["categoria"] for item in summary["por_categoria"]] == [
+        "Mercado",
+        "Transporte",
+        "Sem categoria",
+    ]
+    assert summary["por_categoria"][0]["variacao_percentual"] == 50
+    assert summary["maiores_despesas"][0]["categoria"] == "Mercado"
+    assert len(summary["serie"]) == 2
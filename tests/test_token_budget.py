@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+from src import database
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+
+def _run(test):
+    async def run():
+        redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        try:
+            return await test(redis_client)
+        finally:
+            await redis_client.aclose()
+
+    return asyncio.run(run())
+
+
+def _at_bucket(monkeypatch, bucket):
+    monkeypatch.setattr(
+        database.time, "time", lambda: bucket * database.TOKEN_BUDGET_BUCKET_SIZE
+    )
+
+
+def test_token_budget_sums_the_window(monkeypatch):
+    async def test(redis_client):
+        token_budget = database.TokenBudget(redis_client)
+
+        _at_bucket(monkeypatch, 1000)
+        await token_budget.record("5511", 100)
+        await token_budget.record("5511", 0)
+        _at_bucket(monkeypatch, 1010)
+        await token_budget.record("5511", 50)
+        await token_budget.record("5522", 7)
+
+        return await token_budget.get_used("5511"), await token_budget.get_used("x")
+
+    assert _run(test) == (150, 0)
+
+
+def test_token_budget_drops_buckets_outside_the_window(monkeypatch):
+    window = database.TOKEN_BUDGET_WINDOW // database.TOKEN_BUDGET_BUCKET_SIZE
+
+    async def test(redis_client):
+        token_budget = database.TokenBudget(redis_client)
+        key = token_budget.key("5511")
+
+        _at_bucket(monkeypatch, 1000)
+        await token_budget.record("5511", 100)
+        _at_bucket(monkeypatch, 1000 + window)
+        used_at_the_edge = await token_budget.get_used("5511")
+        _at_bucket(monkeypatch, 1001 + window)
+        used_after = await token_budget.get_used("5511")
+        await token_budget.record("5511", 5)
+
+        return used_at_the_edge, used_after, await redis_client.hgetall(key)
+
+    assert _run(test) == (100, 0, {str(1001 + window): "5"})
+
+
+def test_conversation_store_locks_until_commit(monkeypatch):
+    _at_bucket(monkeypatch, 1000)
+
+    async def test(redis_client):
+        store = database.ConversationStore(redis_client)
+        token_budget = database.TokenBudget(redis_client)
+        await token_budget.record("5511", 40)
+
+        first = await store.bootstrap("5511")
+        locked = await store.bootstrap("5511")
+        await store.commit("5511", {"step": "RegisterBill"}, 60)
+        after_commit = await store.bootstrap("5511")
+
+        lock_ttl = await redis_client.ttl(store.keys("5511")[0])
+        state_ttl = await redis_client.ttl(store.keys("5511")[1])
+
+        return first, locked, after_commit, lock_ttl, state_ttl
+
+    first, locked, after_commit, lock_ttl, state_ttl = _run(test)
+
+    assert first == ({}, 40)
+    assert locked is None
+    assert after_commit == ({"step": "RegisterBill"}, 100)
+    assert 0 < lock_ttl <= 30
+    assert 0 < state_ttl <= database.CONVERSATION_STATE_EXPIRATION
+
+
+def test_conversation_store_commit_without_tokens(monkeypatch):
+    _at_bucket(monkeypatch, 1000)
+
+    async def test(redis_client):
+        store = database.ConversationStore(redis_client)
+
+        await store.bootstrap("5511")
+        await store.commit("5511", {}, 0)
+
+        return await redis_client.exists(store.keys("5511")[2])
+
+    assert _run(test) == 0
@@ -0,0 +1,50 @@
+from src import util
+
+ANALYSIS = (
+    "Seus gastos de março somaram R$1.250,00, um pouco acima de fevereiro. "
+    "A maior parte ficou em alimentação e transporte, veja os destaques:\n"
+    "1. Alimentação: R$620,00, com muitas idas ao mercado no fim do mês.\n"
+    "2. Transporte: R$310,00, quase tudo em corridas de aplicativo.\n"
+    "3. Lazer: R$180,00, concentrado em dois fins de semana.\n\n"
+    "Vale a pena planejar as compras do mês. Assim dá para economizar!"
+)
+
+
+def _stream(text, size=7):
+    chunks = []
+    pending = ""
+
+    for start in range(0, len(text), size):
+        pending += text[start : start + size]
+        parts, pending = util.split_text_chunks(pending, min_size=100)
+        chunks.extend(parts)
+
+    if pending.strip():
+        chunks.append(pending.strip())
+
+    return chunks
+
+
+def test_streamed_chunks_keep_list_items_whole():
+    chunks = _stream(ANALYSIS)
+
+    assert "\n".join(chunks).split() == ANALYSIS.split()
+    for chunk in chunks:
+        for line in chunk.splitlines():
+            assert not line.rstrip().endswith(("1.", "2.", "3."))
+            assert line[0] not in "123" or line[1:3] == ". "
+
+
+def test_long_sentences_are_split_at_the_last_sentence_end():
+    text = "Primeira frase bem longa. " * 5 + "Segunda sem fim"
+
+    chunks, rest = util.split_text_chunks(text, min_size=50)
+
+    assert chunks == [text[: text.rfind(".") + 1]]
+    assert rest == "Segunda sem fim"
+
+
+def test_list_numbers_are_not_sentence_ends():
+    text = "Veja os itens 1. mercado e 2. farmácia, que somaram mais"
+
+    assert util.split_text_chunks(text, min_size=10) == ([], text)